@@ -1,11 +1,14 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 
+from src.data.cluster import read_labels
+from src.data.series import read_series_store
+
 party = 'left'
 
-dataset = pd.read_csv(f'./data/interim/series/{party}/series.csv')
-clusters_2 = pd.read_csv(f'./data/processed/cluster/series/{party}/2/cluster.csv')
+dataset = read_series_store(f'./data/interim/series/{party}/series').reset_index()
+clusters_2 = read_labels(f'./data/processed/cluster/series/{party}/labels.npz')[2]
+clusters_2 = clusters_2.rename('cluster').reset_index()
 
 clusters_dataset_2 = dataset.merge(clusters_2)
 
@@ -2,13 +2,18 @@
 import logging
 from pathlib import Path
 
-from pandas import read_csv, concat, Series, DataFrame
-
+import click
+from pandas import concat, read_csv
 from matplotlib import pyplot as plt
 
-from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
+from scipy.cluster.hierarchy import dendrogram
 
-from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
+from src.data.cluster import (cluster_metrics, cut_tree_labels, ward_linkage,
+                              write_labels)
+from src.data.manifest import Manifest
+from src.data.scaling import select_scaling
+from src.data.series import read_series_store, series_store_paths
+from src.data.storage import interim_path, read_interim
 
 
 # Code from https://joernhees.de/blog/2015/08/26/scipy-hierarchical-clustering-and-dendrogram-tutorial/
@@ -37,7 +42,7 @@ def fancy_dendrogram(*args, **kwargs):
     return ddata
 
 
-def make_dendrograms_and_cluster_datasets():
+def make_dendrograms_and_cluster_datasets(sample_size=None, seed=None):
     logger = logging.getLogger(__name__)
 
     parties = ['PT', 'PSDB']
@@ -46,9 +51,8 @@ def make_dendrograms_and_cluster_datasets():
     series_dir = Path(interim_dir, 'series').resolve()
     processed_dir = Path(data_dir, 'processed').resolve()
     latlon_dir = Path(processed_dir, 'latlon').resolve()
-    epsg_4326_dir = Path(processed_dir, 'epsg_4326').resolve()
-    epsg_4674_dir = Path(processed_dir, 'epsg_4674').resolve()
     cluster_dir = Path(processed_dir, 'cluster').resolve()
+    linkage_dir = Path(interim_dir, 'linkage').resolve()
     cluster_dir.mkdir(exist_ok=True)
 
     dendrogram_dir = Path(reports_dir, 'dendrogram').resolve()
@@ -56,33 +60,44 @@ def make_dendrograms_and_cluster_datasets():
 
     metrics_dir = Path(processed_dir, 'metrics').resolve()
     metrics_dir.mkdir(exist_ok=True)
-
-    metrics_metadata = {
-        'silhouette': silhouette_score,
-        'calinski_harabasz': calinski_harabasz_score,
-        'davies_bouldin': davies_bouldin_score
-    }
+    metrics_path = Path(metrics_dir, 'metrics.csv').resolve()
 
     metadata_by_type = {
         'series': {
             'dir': series_dir,
-            'file_name': 'series.csv'
+            'file_name': 'series',
+            'store': True
         },
         'normalized_lat_lon': {
             'dir': latlon_dir,
-            'file_name': 'latlon.csv'
+            'file_name': 'latlon.csv',
+            'scaling': 'normalized_lat_lon'
         },
         'epsg_4326': {
-            'dir': epsg_4326_dir,
-            'file_name': 'latlon.csv'
+            'dir': latlon_dir,
+            'file_name': 'latlon.csv',
+            'scaling': 'epsg_4326'
         },
         'epsg_4674': {
-            'dir': epsg_4674_dir,
-            'file_name': 'latlon.csv'
+            'dir': latlon_dir,
+            'file_name': 'latlon.csv',
+            'scaling': 'epsg_4674'
         }
     }
 
     n_clusters_values = [2, 3, 4, 5, 6, 7, 8, 9, 10]
+    params = {'n_clusters_values': n_clusters_values,
+              'sample_size': sample_size, 'seed': seed}
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+
+    # Metrics of the parties left untouched are kept from the last table
+    previous_metrics = None
+    if metrics_path.exists():
+        previous_metrics = read_csv(
+            metrics_path, index_col=['data_type', 'party', 'n_clusters'],
+            float_precision='round_trip').sort_index()
+    metrics_by_key = {}
+
     for data_type, metadata in metadata_by_type.items():
         data_type_dir = Path(cluster_dir, data_type).resolve()
         data_type_dir.mkdir(exist_ok=True)
@@ -90,18 +105,37 @@ def make_dendrograms_and_cluster_datasets():
         dendrogram_data_type_dir = Path(dendrogram_dir, data_type).resolve()
         dendrogram_data_type_dir.mkdir(exist_ok=True)
 
-        metrics_data_type_dir = Path(metrics_dir, data_type).resolve()
-        metrics_data_type_dir.mkdir(exist_ok=True)
-
         for party in parties:
             party_dir = Path(data_type_dir, party).resolve()
             party_dir.mkdir(exist_ok=True)
 
             file_path = Path(metadata['dir'], party,
                              metadata['file_name']).resolve()
-            dataset = read_csv(file_path)
 
-            links = linkage(dataset.drop(columns='cod_mun'), method='ward')
+            key = (data_type, party)
+            if metadata.get('store'):
+                inputs = list(series_store_paths(file_path))
+            else:
+                inputs = [interim_path(file_path)]
+            outputs = [
+                Path(dendrogram_data_type_dir, party,
+                     'dendrogram.pdf').resolve(),
+                Path(party_dir, 'labels.npz').resolve()
+            ]
+            if (previous_metrics is not None and
+                    key in previous_metrics.index.droplevel('n_clusters') and
+                    manifest.is_fresh('cluster', key, inputs, outputs,
+                                      params)):
+                metrics_by_key[key] = previous_metrics.loc[key]
+                continue
+
+            if metadata.get('store'):
+                dataset = read_series_store(file_path).reset_index()
+            else:
+                dataset = select_scaling(read_interim(file_path),
+                                         metadata['scaling'])
+
+            links = ward_linkage(dataset.drop(columns='cod_mun'), linkage_dir)
 
             dendrogram_party_dir = Path(
                 dendrogram_data_type_dir, party).resolve()
@@ -123,54 +157,30 @@ def make_dendrograms_and_cluster_datasets():
             plt.savefig(dendrogram_filepath)
             plt.close()
 
-            metrics_party_dir = Path(
-                metrics_data_type_dir, party).resolve()
-            metrics_party_dir.mkdir(exist_ok=True)
-
-            metrics_filepath = Path(
-                metrics_party_dir, 'metrics.csv').resolve()
-
-            metrics_frame = DataFrame()
-
-            for n_clusters in n_clusters_values:
-
-                logger.info(
-                    f'starting to create {party} {n_clusters} cluster data with {data_type} data')
-
-                labels = fcluster(links, n_clusters,
-                                  criterion='maxclust')
-                labels = Series(labels)
-                labels.name = 'cluster'
-
-                cluster_dataset = concat((dataset['cod_mun'], labels), 1)
-                cluster_dataset['cod_mun'] = cluster_dataset['cod_mun'].astype(
-                    int)
-
-                n_clusters_dir = Path(party_dir, str(n_clusters)).resolve()
-                n_clusters_dir.mkdir(exist_ok=True)
-                file_path = Path(n_clusters_dir, 'cluster.csv')
-
-                cluster_dataset.to_csv(file_path, index=False)
-
-                scores = []
-                for _, function in metrics_metadata.items():
-                    score = function(dataset.drop(columns='cod_mun'), labels)
-                    scores.append(score)
-
-                scores = Series(scores)
-                scores.name = str(n_clusters)
-
-                metrics_frame = metrics_frame.append(scores)
-
-                logger.info(
-                    f'done creating {party} {n_clusters} cluster data')
-
-            metrics_frame.columns = metrics_metadata.keys()
-            metrics_frame.index.name = 'n_clusters'
-            metrics_frame.to_csv(metrics_filepath)
-
-
-def main():
+            labels_matrix = cut_tree_labels(links, n_clusters_values)
+            write_labels(Path(party_dir, 'labels.npz'), dataset['cod_mun'],
+                         n_clusters_values, labels_matrix)
+
+            logger.info(
+                f'starting to calculate {party} cluster metrics with {data_type} data')
+            metrics_by_key[key] = cluster_metrics(
+                dataset.drop(columns='cod_mun'), labels_matrix,
+                n_clusters_values, sample_size, seed)
+            logger.info(
+                f'done calculating {party} cluster metrics')
+            manifest.record('cluster', key, inputs, outputs,
+                            params)
+
+    metrics = concat(metrics_by_key, names=['data_type', 'party'])
+    metrics.to_csv(metrics_path)
+
+
+@click.command()
+@click.option('--sample-size', type=int, default=None,
+              help='Rows the silhouette is averaged over, all by default.')
+@click.option('--seed', type=int, default=None,
+              help='Seed of the silhouette sample.')
+def main(sample_size, seed):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -178,7 +188,7 @@ def main():
 
     logger.info(
         'creating cluster data... Saving at ../data/processed/cluster')
-    make_dendrograms_and_cluster_datasets()
+    make_dendrograms_and_cluster_datasets(sample_size, seed)
     logger.info(
         'done creating cluster data... Saved at ../data/processed/cluster')
 
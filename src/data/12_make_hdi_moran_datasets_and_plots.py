@@ -2,17 +2,18 @@
 import logging
 from pathlib import Path
 
+import click
 from pandas import read_csv, read_excel, DataFrame
-from geopandas import read_file
-
-from libpysal.weights import Queen
-from esda import Moran, Moran_Local
 
 from splot.esda import plot_moran, plot_local_autocorrelation
 import matplotlib.pyplot as plt
 
+from src.data.mesh import read_mesh
+from src.data.moran import compute_local_moran, compute_moran
+from src.data.weights import queen_weights
+
 
-def make_moran_datasets_and_plots():
+def make_moran_datasets_and_plots(permutations=999, seed=None, n_jobs=1):
     logger = logging.getLogger(__name__)
 
     external_dir = Path(data_dir, 'external').resolve()
@@ -20,9 +21,8 @@ def make_moran_datasets_and_plots():
     reports_dir = Path(project_dir, 'reports').resolve()
 
     mesh_path = Path(external_dir, 'cities.json')
-    mesh = read_file(mesh_path)
-
-    mesh.CD_GEOCMU = mesh.CD_GEOCMU.astype(int)
+    mesh_dir = Path(data_dir, 'interim', 'mesh').resolve()
+    mesh = read_mesh(mesh_path, mesh_dir)
     mesh = mesh.sort_index()
 
     years = [1991, 2000, 2010]
@@ -46,10 +46,8 @@ def make_moran_datasets_and_plots():
     dataset.columns = ['CD_GEOCMU', 'Espacialidades'] + years
     merged_mesh = mesh.merge(dataset, on='CD_GEOCMU')
 
-    logger.info('starting to calculate weights...')
-    weights = Queen.from_dataframe(merged_mesh)
-    logger.info(
-        f'done calculating weights')
+    weights_dir = Path(data_dir, 'interim', 'weights').resolve()
+    weights = queen_weights(merged_mesh, weights_dir, [mesh_path, file_path])
 
     moran_values = []
     p_values = []
@@ -58,7 +56,8 @@ def make_moran_datasets_and_plots():
         logger.info(
             'starting to calculate global moran\'s index at {}'.format(year))
 
-        moran = Moran(merged_mesh[year], weights)
+        moran = compute_moran(merged_mesh[year], weights,
+                              permutations, seed, n_jobs)
         moran_values.append(moran.I)
         p_values.append(moran.p_sim)
 
@@ -81,7 +80,8 @@ def make_moran_datasets_and_plots():
         logger.info(
             'starting to calculate local moran\'s index at {}'.format(year))
 
-        local_moran = Moran_Local(merged_mesh[year], weights)
+        local_moran = compute_local_moran(
+            merged_mesh[year], weights, permutations, seed, n_jobs)
 
         fig, ax = plot_local_autocorrelation(
             local_moran, merged_mesh, year)
@@ -121,7 +121,14 @@ def make_moran_datasets_and_plots():
     plt.close(fig)
 
 
-def main():
+@click.command()
+@click.option('--permutations', type=click.IntRange(min=1), default=999,
+              help='Permutations used for the pseudo p-values.')
+@click.option('--seed', type=int, default=None,
+              help='Seed of the permutations.')
+@click.option('--n-jobs', type=int, default=1,
+              help='Processes sharing the permutations.')
+def main(permutations, seed, n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -129,7 +136,7 @@ def main():
 
     logger.info(
         'using series data to make moran dataset... Saving at ../reports/moran_hdi')
-    make_moran_datasets_and_plots()
+    make_moran_datasets_and_plots(permutations, seed, n_jobs)
     logger.info(
         'done making moran dataset... Saved at ../reports/moran_hdi')
 
@@ -2,13 +2,14 @@
 import logging
 from pathlib import Path
 
-from pandas import read_csv, read_excel, concat, Series, DataFrame
+import click
+from pandas import read_csv, read_excel, concat, Series
 
 from matplotlib import pyplot as plt
 
-from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
+from scipy.cluster.hierarchy import linkage, dendrogram
 
-from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
+from src.data.cluster import cluster_metrics, cut_tree_labels
 
 
 # Code from https://joernhees.de/blog/2015/08/26/scipy-hierarchical-clustering-and-dendrogram-tutorial/
@@ -37,7 +38,7 @@ def fancy_dendrogram(*args, **kwargs):
     return ddata
 
 
-def make_dendrograms_and_cluster_datasets():
+def make_dendrograms_and_cluster_datasets(sample_size=None, seed=None):
     logger = logging.getLogger(__name__)
 
     processed_dir = Path(data_dir, 'processed').resolve()
@@ -50,12 +51,6 @@ def make_dendrograms_and_cluster_datasets():
     metrics_dir = Path(processed_dir, 'metrics_hdi').resolve()
     metrics_dir.mkdir(exist_ok=True)
 
-    metrics_metadata = {
-        'silhouette': silhouette_score,
-        'calinski_harabasz': calinski_harabasz_score,
-        'davies_bouldin': davies_bouldin_score
-    }
-
     n_clusters_values = [2, 3]
 
     file_path = Path(data_dir, 'raw', 'hdi.xlsx').resolve()
@@ -85,16 +80,14 @@ def make_dendrograms_and_cluster_datasets():
     metrics_filepath = Path(
         metrics_dir, 'metrics.csv').resolve()
 
-    metrics_frame = DataFrame()
+    labels_matrix = cut_tree_labels(links, n_clusters_values)
 
-    for n_clusters in n_clusters_values:
+    for column, n_clusters in enumerate(n_clusters_values):
 
         logger.info(
             f'starting to create {n_clusters} cluster data')
 
-        labels = fcluster(links, n_clusters,
-                          criterion='maxclust')
-        labels = Series(labels)
+        labels = Series(labels_matrix[:, column])
         labels.name = 'cluster'
 
         cluster_dataset = concat((dataset['CD_GEOCMU'], labels), 1)
@@ -105,26 +98,21 @@ def make_dendrograms_and_cluster_datasets():
 
         cluster_dataset.to_csv(file_path, index=False)
 
-        scores = []
-        for _, function in metrics_metadata.items():
-            score = function(dataset.drop(
-                columns=['CD_GEOCMU', 'Espacialidades']), labels)
-            scores.append(score)
-
-        scores = Series(scores)
-        scores.name = str(n_clusters)
-
-        metrics_frame = metrics_frame.append(scores)
-
         logger.info(
             f'done creating {n_clusters} cluster data')
 
-    metrics_frame.columns = metrics_metadata.keys()
-    metrics_frame.index.name = 'n_clusters'
+    metrics_frame = cluster_metrics(
+        dataset.drop(columns=['CD_GEOCMU', 'Espacialidades']), labels_matrix,
+        n_clusters_values, sample_size, seed)
     metrics_frame.to_csv(metrics_filepath)
 
 
-def main():
+@click.command()
+@click.option('--sample-size', type=int, default=None,
+              help='Rows the silhouette is averaged over, all by default.')
+@click.option('--seed', type=int, default=None,
+              help='Seed of the silhouette sample.')
+def main(sample_size, seed):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -132,7 +120,7 @@ def main():
 
     logger.info(
         'creating cluster data... Saving at ../data/processed/cluster')
-    make_dendrograms_and_cluster_datasets()
+    make_dendrograms_and_cluster_datasets(sample_size, seed)
     logger.info(
         'done creating cluster data... Saved at ../data/processed/cluster')
 
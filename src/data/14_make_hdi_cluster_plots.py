@@ -1,24 +1,24 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv, read_excel, concat, Series
+import click
+from pandas import read_csv
 
-from geopandas import read_file
+from src.data.choropleth import render_choropleths
+from src.data.manifest import Manifest
+from src.data.mesh import read_mesh
 
-from matplotlib import pyplot as plt
-
-
-def make_cluster_dataset():
-    logger = logging.getLogger(__name__)
 
+def make_cluster_dataset(n_jobs=1, tolerance=None):
     n_clusters_values = [2, 3]
 
     external_dir = Path(data_dir, 'external').resolve()
 
     mesh_path = Path(external_dir, 'cities.json').resolve()
-    mesh = read_file(mesh_path)
-    mesh.CD_GEOCMU = mesh.CD_GEOCMU.astype(int)
+    mesh_dir = Path(data_dir, 'interim', 'mesh').resolve()
+    mesh_loader = partial(read_mesh, mesh_path, mesh_dir)
 
     processed_dir = Path(data_dir, 'processed').resolve()
     cluster_dir = Path(processed_dir, 'cluster_hdi').resolve()
@@ -26,34 +26,39 @@ def make_cluster_dataset():
     plots_cluster_dir = Path(reports_dir, 'cluster_hdi').resolve()
     plots_cluster_dir.mkdir(exist_ok=True)
 
+    figures = []
     for n_clusters in n_clusters_values:
-        logger.info(
-            f'starting to create {n_clusters} clusters data')
-
         file_path = Path(cluster_dir, str(n_clusters),
                          'cluster.csv').resolve()
         dataset = read_csv(file_path)
-        dataset = dataset.rename(columns={'Código': 'COD_GEOCMU'})
         dataset.CD_GEOCMU = dataset.CD_GEOCMU.astype(int)
 
-        merged_mesh = mesh.merge(dataset, on='CD_GEOCMU')
-        merged_mesh.plot(column='cluster', cmap='tab20c', legend=True, categorical=True, legend_kwds={
-            'loc': 'lower right'})
-        plt.axis(False)
-
         plot_n_clusters_dir = Path(
             plots_cluster_dir, str(n_clusters)).resolve()
-        plot_n_clusters_dir.mkdir(exist_ok=True)
-        file_path = Path(plot_n_clusters_dir, 'map.pdf')
-        plt.suptitle(f'{n_clusters} grupos')
-        plt.savefig(file_path)
-        plt.close()
-
-        logger.info(
-            f'done creating {n_clusters} cluster data')
-
-
-def main():
+        figures.append({
+            'key': n_clusters,
+            'inputs': [file_path],
+            'values': dataset.set_index('CD_GEOCMU').cluster,
+            'file_path': Path(plot_n_clusters_dir, 'map.pdf'),
+            'title': f'{n_clusters} grupos',
+            'plot': {
+                'cmap': 'tab20c',
+                'legend': True,
+                'legend_kwds': {'loc': 'lower right'}
+            }
+        })
+
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    render_choropleths(figures, mesh_loader, manifest, 'cluster_plots_hdi',
+                       n_jobs, mesh_key='CD_GEOCMU', tolerance=tolerance)
+
+
+@click.command()
+@click.option('--n-jobs', type=int, default=1,
+              help='Processes rendering the maps.')
+@click.option('--tolerance', type=float, default=None,
+              help='Tolerance the polygons are simplified to, in mesh units.')
+def main(n_jobs, tolerance):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -61,7 +66,7 @@ def main():
 
     logger.info(
         'creating cluster data... Saving at ../data/reports/cluster_hdi')
-    make_cluster_dataset()
+    make_cluster_dataset(n_jobs, tolerance)
     logger.info(
         'done creating cluster data... Saved at ../data/reports/cluster_hdi')
 
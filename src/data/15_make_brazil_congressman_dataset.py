@@ -2,81 +2,55 @@
 import logging
 from pathlib import Path
 
-from pandas import DataFrame
-from pandas import read_csv, concat
+import click
 
+from src.data.manifest import Manifest
+from src.data.schema import ELECTION_LAYOUTS
+from src.data.state_files import read_states, state_sources, write_states
+from src.data.storage import interim_path, write_interim
 
-def create_br_dataset(year, metadata):
-    br = DataFrame()
 
-    for state in metadata['states']:
-        file_path = Path(
-            data_dir,
-            'raw',
-            'elections_1994_2018',
-            'votacao_partido_munzona_{}'.format(year),
-            'votacao_partido_munzona_{}_{}.{}'.format(
-                year, state, metadata['file_extension'])
-        ).resolve()
-        uf = read_csv(file_path, sep=';', encoding='latin',
-                      header=metadata['header'])
-        br = concat([br, uf])
+def create_br_dataset(year, metadata, source='dir', n_jobs=1):
+    raw_dir = Path(data_dir, 'raw').resolve()
+    return read_states(raw_dir, year, metadata, source, n_jobs)
 
-    br.columns = metadata['columns']
-    br.sort_values(by=['sigla_uf', 'nome_mun'], inplace=True)
-    return br
 
-
-def make_br_dataset():
+def make_br_dataset(source='dir', stream=False, chunksize=100000, n_jobs=1):
     logger = logging.getLogger(__name__)
 
-    pre_2012_columns = ['data_geracao', 'hora_geracao', 'ano_eleicao', 'num_turno', 'descricao_eleicao', 'sigla_uf', 'sigla_ue', 'cod_mun', 'nome_mun', 'num_zona', 'cod_cargo', 'desc_cargo',
-                        'tipo_legenda', 'nome_coligacao', 'composicao_legenda', 'sigla_partido', 'num_partido', 'nome_partido', 'qtde_votos_nominais', 'qtde_votos_legenda', 'sequencial_coligacao']
-    post_2012_columns = ['data_geracao', 'hora_geracao', 'ano_eleicao', 'cod_tipo_eleicao', 'nome_eleicao', 'num_turno', 'cod_eleicao', 'descricao_eleicao', 'data_eleicao', 'tipo_abrangencia', 'sigla_uf', 'sigla_ue', 'nome_ue', 'cod_mun',
-                         'nome_mun', 'num_zona', 'cod_cargo', 'desc_cargo', 'tipo_abrangencia', 'num_partido', 'sigla_partido', 'nome_partido', 'seq_coligacao', 'nome_coligacao', 'desc_comp_colig', 'voto_transito', 'qtde_votos_nominais', 'qtde_votos_legenda']
-
     metadata_by_year = {
         1998: {
             'states': ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO'],
-            'columns': pre_2012_columns,
-            'file_extension': 'txt',
-            'header': None
+            **ELECTION_LAYOUTS['pre_2012']
         },
         2002: {
             'states': ['AC', 'AL', 'AM', 'AP', 'BA', 'BR', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO'],
-            'columns': pre_2012_columns,
-            'file_extension': 'txt',
-            'header': None
+            **ELECTION_LAYOUTS['pre_2012']
         },
         2006: {
             'states': ['AC', 'AL', 'AM', 'AP', 'BA', 'BR', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO'],
-            'columns': pre_2012_columns,
-            'file_extension': 'txt',
-            'header': None
+            **ELECTION_LAYOUTS['pre_2012']
         },
         2010: {
             'states': ['AL', 'AC', 'AM', 'AP', 'BA', 'BR', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO'],
-            'columns': pre_2012_columns,
-            'file_extension': 'txt',
-            'header': None
+            **ELECTION_LAYOUTS['pre_2012']
         },
         2014: {
             'states': ['BRASIL'],
-            'columns': post_2012_columns,
-            'file_extension': 'csv',
-            'header': 0
+            **ELECTION_LAYOUTS['post_2012']
         },
         2018: {
             'states': ['BRASIL'],
-            'columns': post_2012_columns,
-            'file_extension': 'csv',
-            'header': 0
+            **ELECTION_LAYOUTS['post_2012']
         },
     }
 
     elections_1994_2018_dir = Path(
         data_dir, 'interim', 'brazil_congressmen').resolve()
     elections_1994_2018_dir.mkdir(exist_ok=True)
+    raw_dir = Path(data_dir, 'raw').resolve()
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    stage = 'brazil_congressmen'
     for year in metadata_by_year:
         logger.info('starting to join {} data'.format(year))
         year_dir = Path(elections_1994_2018_dir, str(year))
@@ -85,12 +59,37 @@ def make_br_dataset():
             year_dir,
             'br.csv'
         )
-        br_dataset = create_br_dataset(year, metadata_by_year[year])
-        br_dataset.to_csv(destination_path, index=None)
+
+        inputs = state_sources(raw_dir, year, metadata_by_year[year],
+                               source)
+        outputs = [interim_path(destination_path)]
+        params = metadata_by_year[year]
+        if manifest.is_fresh(stage, year, inputs, outputs, params):
+            continue
+
+        if stream:
+            write_states(raw_dir, year, metadata_by_year[year],
+                         destination_path, source, chunksize)
+        else:
+            br_dataset = create_br_dataset(
+                year, metadata_by_year[year], source, n_jobs)
+            write_interim(br_dataset, destination_path)
+        manifest.record(stage, year, inputs, outputs, params)
         logger.info('finished joining {} data'.format(year))
 
 
-def main():
+@click.command()
+@click.option('--source', type=click.Choice(['dir', 'zip']), default='dir',
+              help='Read extracted state files or read them straight from the '
+              'votacao_partido_munzona_{year}.zip archives.')
+@click.option('--stream/--batch', default=None,
+              help='Append each state straight to br.csv instead of joining '
+              'the year in memory. Defaults to streaming for zip sources.')
+@click.option('--chunksize', type=int, default=100000,
+              help='Rows read at a time when streaming.')
+@click.option('--n-jobs', type=int, default=1,
+              help='State files read concurrently when joining in memory.')
+def main(source, stream, chunksize, n_jobs):
     """ Runs data processing scripts to turn raw data from (../raw) into
         joined brazil voting datasets by year (saved in ../interim/brazil).
     """
@@ -98,7 +97,9 @@ def main():
 
     logger.info(
         'joining states data into Brazil data... Saving at ../data/interim/brazil')
-    make_br_dataset()
+    if stream is None:
+        stream = source == 'zip'
+    make_br_dataset(source, stream, chunksize, n_jobs)
     logger.info(
         'done joining states data into Brazil data... Saved at ../data/interim/brazil')
 
@@ -1,37 +1,64 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv
+import click
 
+from src.data.manifest import Manifest
+from src.data.parallel import run_tasks
+from src.data.storage import interim_path, read_interim, write_interim
 
-def make_congressmen_dataset():
+
+def make_congressmen_year_dataset(year, interim_dir, elections_1994_1998_dir,
+                                  columns, manifest):
     logger = logging.getLogger(__name__)
 
+    logger.info('starting to filter {} data'.format(year))
+    source_path = Path(elections_1994_1998_dir,
+                       str(year), 'br.csv').resolve()
+
+    congressmen_dir = Path(interim_dir, 'congressmen').resolve()
+    year_dir = Path(congressmen_dir, str(year)).resolve()
+    file_path = Path(year_dir, 'congressmen.csv').resolve()
+
+    inputs = [interim_path(source_path)]
+    outputs = [interim_path(file_path)]
+    if manifest.is_fresh('congressmen', year, inputs, outputs, columns):
+        return
+
+    data = read_interim(source_path, columns=columns)
+
+    congressmen = data[data.cod_cargo == 6]
+
+    congressmen_dir.mkdir(exist_ok=True)
+    year_dir.mkdir(exist_ok=True)
+
+    write_interim(congressmen, file_path)
+    manifest.record('congressmen', year, inputs, outputs, columns)
+    logger.info('finished filtering {} data'.format(year))
+
+
+def make_congressmen_dataset(n_jobs=1):
     years = [1998, 2002, 2006, 2010, 2014, 2018]
+    columns = ['num_turno', 'sigla_uf', 'cod_mun', 'cod_cargo',
+               'sigla_partido', 'qtde_votos_nominais', 'qtde_votos_legenda']
 
     interim_dir = Path(data_dir, 'interim').resolve()
     elections_1994_1998_dir = Path(
         interim_dir, 'brazil_congressmen').resolve()
-    for year in years:
-        logger.info('starting to filter {} data'.format(year))
-        file_path = Path(elections_1994_1998_dir,
-                         str(year), 'br.csv').resolve()
-        data = read_csv(file_path)
-
-        congressmen = data[data.cod_cargo == 6]
-
-        congressmen_dir = Path(interim_dir, 'congressmen').resolve()
-        congressmen_dir.mkdir(exist_ok=True)
-        year_dir = Path(congressmen_dir, str(year)).resolve()
-        year_dir.mkdir(exist_ok=True)
-
-        file_path = Path(year_dir, 'congressmen.csv').resolve()
-        congressmen.to_csv(file_path, index=None)
-        logger.info('finished filtering {} data'.format(year))
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_congressmen_year_dataset,
+                                interim_dir=interim_dir,
+                                elections_1994_1998_dir=elections_1994_1998_dir,
+                                columns=columns, manifest=manifest)
+    run_tasks(make_year_dataset, years, n_jobs)
 
 
-def main():
+@click.command()
+@click.option('--n-jobs', type=int, default=1,
+              help='Years processed concurrently.')
+def main(n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         congressmen data (saved in ../interim/congressmen).
     """
@@ -39,7 +66,7 @@ def main():
 
     logger.info(
         'filtering congressmen data... Saving at ../data/interim/congressmen')
-    make_congressmen_dataset()
+    make_congressmen_dataset(n_jobs)
     logger.info(
         'done filtering congressmen data... Saved at ../data/interim/congressmen')
 
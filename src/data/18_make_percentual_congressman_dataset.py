@@ -1,41 +1,65 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv
+import click
 
+from src.data.manifest import Manifest
+from src.data.parallel import run_tasks
+from src.data.storage import interim_path, read_interim, write_interim
 
-def make_percentual_dataset():
+
+def make_percentual_year_dataset(year, interim_dir, first_turn_dir, manifest):
     logger = logging.getLogger(__name__)
 
+    logger.info('starting to transform {} data'.format(year))
+    source_path = Path(first_turn_dir,
+                       str(year), 'first_turn.csv').resolve()
+
+    percentual_dir = Path(interim_dir, 'percentual_congressmen').resolve()
+    year_dir = Path(percentual_dir, str(year)).resolve()
+    file_path = Path(year_dir, 'percentual.csv').resolve()
+
+    inputs = [interim_path(source_path)]
+    outputs = [interim_path(file_path)]
+    if manifest.is_fresh('percentual_congressmen', year, inputs, outputs):
+        return
+
+    data = read_interim(source_path)
+
+    city_group = data.groupby('cod_mun')
+    party_group = data.groupby(['cod_mun', 'sigla_partido'], observed=True)
+    party_group_agg = party_group.agg({'qtde_votos_nominais': sum, 'qtde_votos_legenda': sum}).sum(axis=1)
+    city_group_agg = city_group.agg({'qtde_votos_nominais': sum, 'qtde_votos_legenda': sum}).sum(axis=1)
+    percentual = party_group_agg / city_group_agg
+    percentual = percentual.rename('percentual_votos')
+
+    percentual_dir.mkdir(exist_ok=True)
+    year_dir.mkdir(exist_ok=True)
+
+    write_interim(percentual, file_path, index=True)
+    manifest.record('percentual_congressmen', year, inputs, outputs)
+    logger.info('finished transforming {} data'.format(year))
+
+
+def make_percentual_dataset(n_jobs=1):
     years = [1998, 2002, 2006, 2010, 2014, 2018]
 
     interim_dir = Path(data_dir, 'interim').resolve()
     first_turn_dir = Path(interim_dir, 'first_turn_congressmen').resolve()
-    for year in years:
-        logger.info('starting to transform {} data'.format(year))
-        file_path = Path(first_turn_dir,
-                         str(year), 'first_turn.csv').resolve()
-        data = read_csv(file_path)
-
-        city_group = data.groupby('cod_mun')
-        party_group = data.groupby(['cod_mun', 'sigla_partido'])
-        party_group_agg = party_group.agg({'qtde_votos_nominais': sum, 'qtde_votos_legenda': sum}).sum(axis=1)
-        city_group_agg = city_group.agg({'qtde_votos_nominais': sum, 'qtde_votos_legenda': sum}).sum(axis=1)
-        percentual = party_group_agg / city_group_agg
-        percentual = percentual.rename('percentual_votos')
-
-        percentual_dir = Path(interim_dir, 'percentual_congressmen').resolve()
-        percentual_dir.mkdir(exist_ok=True)
-        year_dir = Path(percentual_dir, str(year)).resolve()
-        year_dir.mkdir(exist_ok=True)
-
-        file_path = Path(year_dir, 'percentual.csv').resolve()
-        percentual.to_csv(file_path)
-        logger.info('finished transforming {} data'.format(year))
-
-
-def main():
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_percentual_year_dataset,
+                                interim_dir=interim_dir,
+                                first_turn_dir=first_turn_dir,
+                                manifest=manifest)
+    run_tasks(make_year_dataset, years, n_jobs)
+
+
+@click.command()
+@click.option('--n-jobs', type=int, default=1,
+              help='Years processed concurrently.')
+def main(n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -43,7 +67,7 @@ def main():
 
     logger.info(
         'transforming absolute votes in percentual votes... Saving at ../data/interim/percentual')
-    make_percentual_dataset()
+    make_percentual_dataset(n_jobs)
     logger.info(
         'transforming absolute votes in percentual votes... Saved at ../data/interim/percentual')
 
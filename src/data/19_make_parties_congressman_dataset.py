@@ -1,52 +1,106 @@
 # -*- coding: utf-8 -*-
-import logging
 import json
+import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv
+import click
 
+from src.data.blocs import aggregate_blocs, bloc_parties
+from src.data.manifest import Manifest
+from src.data.parallel import run_tasks
+from src.data.shares import make_shares, shares_matrix, write_shares
+from src.data.storage import interim_path, read_interim, write_interim
 
-def make_parties_dataset():
-    logger = logging.getLogger(__name__)
-
-    years = [1998, 2002, 2006, 2010, 2014, 2018]
-    party_filepath = Path(data_dir, 'external', 'left_right_parties.json')
-    with open(party_filepath) as parties_file:
-        parties = json.load(parties_file)
 
-    interim_dir = Path(data_dir, 'interim').resolve()
-    percentual_dir = Path(interim_dir, 'percentual_congressmen').resolve()
+def make_parties_year_dataset(year, blocs, percentual_dir, shares_dir,
+                              parties_dir, manifest):
+    logger = logging.getLogger(__name__)
 
-    parties_dir = Path(interim_dir, 'parties').resolve()
-    parties_dir.mkdir(exist_ok=True)
-    for year in years:
-        logger.info('starting to filter {} data'.format(year))
+    logger.info('starting to filter {} data'.format(year))
+
+    source_path = Path(percentual_dir, str(year), 'percentual.csv').resolve()
+    shares_path = Path(shares_dir, str(year), 'shares.csv').resolve()
+
+    inputs = [interim_path(source_path)]
+    outputs = [interim_path(shares_path)]
+    shares = None
+    if not manifest.is_fresh('shares_congressmen', year, inputs, outputs):
+        logger.info('starting to compute {} shares'.format(year))
+        shares = make_shares(read_interim(source_path))
+        shares_path.parent.mkdir(parents=True, exist_ok=True)
+        write_shares(shares, shares_path)
+        manifest.record('shares_congressmen', year, inputs, outputs)
+        logger.info('finished computing {} shares'.format(year))
+
+    year_dir = Path(parties_dir, str(year)).resolve()
+    year_dir.mkdir(exist_ok=True)
+
+    stale = {}
+    for bloc, members in blocs.items():
+        file_path = Path(year_dir, bloc, 'party.csv').resolve()
+        inputs = [interim_path(shares_path)]
+        outputs = [interim_path(file_path)]
+        params = bloc_parties(members, year)
+        if not manifest.is_fresh('parties_congressmen', (year, bloc), inputs,
+                                 outputs, params):
+            stale[bloc] = (file_path, inputs, outputs, params)
+    if not stale:
+        logger.info('finished filtering {} data'.format(year))
+        return
 
-        year_dir = Path(parties_dir, str(year)).resolve()
-        year_dir.mkdir(exist_ok=True)
+    if shares is None:
+        shares = read_interim(shares_path)
+    bloc_shares = aggregate_blocs(shares_matrix(shares), {'blocs': blocs},
+                                  year)['blocs']
 
-        file_path = Path(percentual_dir, str(year), 'percentual.csv').resolve()
-        data = read_csv(file_path)
-        for party in parties:
-            logger.info(
-                'starting to filter {} data from {} parties'.format(year, party))
+    for bloc, (file_path, inputs, outputs, params) in stale.items():
+        file_path.parent.mkdir(exist_ok=True)
+        party_data = bloc_shares[bloc].rename('percentual_votos')
+        write_interim(party_data, file_path, index=True)
+        manifest.record('parties_congressmen', (year, bloc), inputs, outputs,
+                        params)
 
-            party_dir = Path(year_dir, party).resolve()
-            party_dir.mkdir(exist_ok=True)
+        logger.info(
+            'finished filtering {} data from {}'.format(year, bloc))
 
-            file_path = Path(party_dir, 'party.csv').resolve()
-            party_data = data[data.sigla_partido.isin(parties[party])]
-            party_data = party_data[['cod_mun', 'percentual_votos']]
-            party_data = party_data.groupby('cod_mun').sum().reset_index()
-            party_data.to_csv(file_path, index=None)
+    logger.info('finished filtering {} data'.format(year))
 
-            logger.info(
-                'finished filtering {} data from {}'.format(year, party))
 
-        logger.info('finished filtering {} data'.format(year))
+def make_parties_dataset(blocs_path=None, n_jobs=1):
+    """ Writes the shares of every party in every municipality as one file
+        per year under interim/shares_congressmen, and the party.csv of
+        each bloc defined at blocs_path, aggregated from them.
+    """
+    years = [1998, 2002, 2006, 2010, 2014, 2018]
+    if blocs_path is None:
+        blocs_path = Path(data_dir, 'external', 'left_right_parties.json')
+    with open(blocs_path) as blocs_file:
+        blocs = json.load(blocs_file)
 
+    interim_dir = Path(data_dir, 'interim').resolve()
+    percentual_dir = Path(interim_dir, 'percentual_congressmen').resolve()
+    shares_dir = Path(interim_dir, 'shares_congressmen').resolve()
 
-def main():
+    parties_dir = Path(interim_dir, 'parties').resolve()
+    parties_dir.mkdir(exist_ok=True)
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_parties_year_dataset,
+                                blocs=blocs,
+                                percentual_dir=percentual_dir,
+                                shares_dir=shares_dir,
+                                parties_dir=parties_dir,
+                                manifest=manifest)
+    run_tasks(make_year_dataset, years, n_jobs)
+
+
+@click.command()
+@click.option('--blocs', 'blocs_path', type=click.Path(exists=True),
+              help='Json of the bloc definitions, '
+                   'data/external/left_right_parties.json by default.')
+@click.option('--n-jobs', type=int, default=1,
+              help='Years processed concurrently.')
+def main(blocs_path, n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -54,7 +108,7 @@ def main():
 
     logger.info(
         'filtering percentual votes to make parties dataset... Saving at ../data/interim/parties')
-    make_parties_dataset()
+    make_parties_dataset(blocs_path, n_jobs)
     logger.info(
         'done filtering percentual votes to make parties dataset... Saved at ../data/interim/parties')
 
@@ -1,18 +1,18 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv, concat, Series
-
-from geopandas import read_file
-
-from matplotlib import pyplot as plt
+import click
 from matplotlib.colors import LinearSegmentedColormap
 
+from src.data.choropleth import render_choropleths
+from src.data.cluster import read_labels
+from src.data.manifest import Manifest
+from src.data.mesh import read_tse_mesh
 
-def make_cluster_dataset():
-    logger = logging.getLogger(__name__)
 
+def make_cluster_dataset(n_jobs=1, tolerance=None):
     parties = ['left', 'right']
     n_clusters_values = [2, 3, 4, 5, 6, 7, 8, 9, 10]
 
@@ -24,14 +24,11 @@ def make_cluster_dataset():
 
     correspondence_path = Path(
         external_dir, 'tse-ibge-correspondence.csv').resolve()
-    correspondence = read_csv(correspondence_path)
 
     mesh_path = Path(external_dir, 'cities.json').resolve()
-    mesh = read_file(mesh_path)
-    mesh.CD_GEOCMU = mesh.CD_GEOCMU.astype(int)
-    mesh = mesh.merge(correspondence[['CD_GEOCMU', 'COD_TSE']], how='right')
-    mesh = mesh.set_index('COD_TSE')
-    mesh = mesh.sort_index()
+    mesh_dir = Path(data_dir, 'interim', 'mesh').resolve()
+    mesh_loader = partial(read_tse_mesh, mesh_path, correspondence_path,
+                          mesh_dir)
 
     processed_dir = Path(data_dir, 'processed').resolve()
     cluster_dir = Path(processed_dir, 'cluster').resolve()
@@ -59,6 +56,7 @@ def make_cluster_dataset():
         }
     }
 
+    figures = []
     for data_type, metadata in metadata_by_type.items():
         data_type_dir = metadata['data_dir']
         plot_data_type_dir = metadata['plot_dir']
@@ -68,34 +66,37 @@ def make_cluster_dataset():
             plot_party_dir = Path(plot_data_type_dir, party).resolve()
             plot_party_dir.mkdir(exist_ok=True)
 
-            for n_clusters in n_clusters_values:
-                logger.info(
-                    f'starting to create {party} {n_clusters} clusters data with {data_type} data')
-
-                file_path = Path(party_dir, str(n_clusters),
-                                 'cluster.csv').resolve()
-                dataset = read_csv(file_path)
-                dataset = dataset.rename(columns={'cod_mun': 'COD_TSE'})
-
-                merged_mesh = mesh.merge(dataset, on='COD_TSE')
-                merged_mesh.plot(column='cluster', cmap=cmaps[index], legend=True, categorical=True, legend_kwds={
-                                 'loc': 'lower right'})
-                plt.axis(False)
+            labels_path = Path(party_dir, 'labels.npz').resolve()
+            labels = read_labels(labels_path)
 
+            for n_clusters in n_clusters_values:
                 plot_n_clusters_dir = Path(
                     plot_party_dir, str(n_clusters)).resolve()
-                plot_n_clusters_dir.mkdir(exist_ok=True)
-                file_path = Path(plot_n_clusters_dir, f'{party}-map-{n_clusters}.png')
-                plt.suptitle(
-                    f'{party}, {metadata["name"]}, {n_clusters} grupos')
-                plt.savefig(file_path)
-                plt.close()
-
-                logger.info(
-                    f'done creating {party} {n_clusters} cluster data')
-
-
-def main():
+                figures.append({
+                    'key': (data_type, party, n_clusters),
+                    'inputs': [labels_path],
+                    'values': labels[n_clusters],
+                    'file_path': Path(plot_n_clusters_dir,
+                                      f'{party}-map-{n_clusters}.png'),
+                    'title': f'{party}, {metadata["name"]}, {n_clusters} grupos',
+                    'plot': {
+                        'cmap': cmaps[index],
+                        'legend': True,
+                        'legend_kwds': {'loc': 'lower right'}
+                    }
+                })
+
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    render_choropleths(figures, mesh_loader, manifest, 'cluster_plots_congressmen',
+                       n_jobs, tolerance=tolerance)
+
+
+@click.command()
+@click.option('--n-jobs', type=int, default=1,
+              help='Processes rendering the maps.')
+@click.option('--tolerance', type=float, default=None,
+              help='Tolerance the polygons are simplified to, in mesh units.')
+def main(n_jobs, tolerance):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -103,7 +104,7 @@ def main():
 
     logger.info(
         'creating cluster data... Saving at ../data/reports/cluster')
-    make_cluster_dataset()
+    make_cluster_dataset(n_jobs, tolerance)
     logger.info(
         'done creating cluster data... Saved at ../data/reports/cluster')
 
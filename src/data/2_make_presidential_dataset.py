@@ -1,37 +1,59 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv
+import click
 
+from src.data.manifest import Manifest
+from src.data.parallel import run_tasks
+from src.data.storage import interim_path, read_interim, write_interim
 
-def make_presidential_dataset():
+
+def make_presidential_year_dataset(year, interim_dir, columns, manifest):
     logger = logging.getLogger(__name__)
 
-    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
+    logger.info('starting to filter {} data'.format(year))
+    source_path = Path(interim_dir, 'brazil', str(year), 'br.csv').resolve()
 
-    interim_dir = Path(data_dir, 'interim').resolve()
-    elections_1994_1998_dir = Path(
-        interim_dir, 'brazil').resolve()
-    for year in years:
-        logger.info('starting to filter {} data'.format(year))
-        file_path = Path(elections_1994_1998_dir,
-                         str(year), 'br.csv').resolve()
-        data = read_csv(file_path)
+    presidential_dir = Path(interim_dir, 'presidential').resolve()
+    year_dir = Path(presidential_dir, str(year)).resolve()
+    file_path = Path(year_dir, 'presidential.csv').resolve()
+
+    inputs = [interim_path(source_path)]
+    outputs = [interim_path(file_path)]
+    if manifest.is_fresh('presidential', year, inputs, outputs, columns):
+        return
+
+    data = read_interim(source_path, columns=columns)
 
-        presidential = data[data.cod_cargo == 1]
+    presidential = data[data.cod_cargo == 1]
 
-        presidential_dir = Path(interim_dir, 'presidential').resolve()
-        presidential_dir.mkdir(exist_ok=True)
-        year_dir = Path(presidential_dir, str(year)).resolve()
-        year_dir.mkdir(exist_ok=True)
+    presidential_dir.mkdir(exist_ok=True)
+    year_dir.mkdir(exist_ok=True)
 
-        file_path = Path(year_dir, 'presidential.csv').resolve()
-        presidential.to_csv(file_path, index=None)
-        logger.info('finished filtering {} data'.format(year))
+    write_interim(presidential, file_path)
+    manifest.record('presidential', year, inputs, outputs, columns)
+    logger.info('finished filtering {} data'.format(year))
+
+
+def make_presidential_dataset(n_jobs=1):
+    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
+    columns = ['num_turno', 'sigla_uf', 'cod_mun', 'cod_cargo',
+               'sigla_partido', 'qtde_votos_nominais']
+
+    interim_dir = Path(data_dir, 'interim').resolve()
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_presidential_year_dataset,
+                                interim_dir=interim_dir, columns=columns,
+                                manifest=manifest)
+    run_tasks(make_year_dataset, years, n_jobs)
 
 
-def main():
+@click.command()
+@click.option('--n-jobs', type=int, default=1,
+              help='Years processed concurrently.')
+def main(n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -39,7 +61,7 @@ def main():
 
     logger.info(
         'filtering presidential data... Saving at ../data/interim/presidential')
-    make_presidential_dataset()
+    make_presidential_dataset(n_jobs)
     logger.info(
         'done filtering presidential data... Saved at ../data/interim/presidential')
 
@@ -1,49 +1,77 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
+import click
 from pandas import read_csv
 
+from src.data.manifest import Manifest
+from src.data.parallel import run_tasks
+from src.data.storage import interim_path, read_interim, write_interim
 
-def make_first_turn_dataset():
+
+def make_first_turn_year_dataset(year, interim_dir, presidential_dir, tse_codes,
+                                 correspondence_path, manifest):
     logger = logging.getLogger(__name__)
 
-    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
+    logger.info('starting to filter {} data'.format(year))
 
-    correspondence_path = Path(
-        data_dir, 'external', 'tse-ibge-correspondence.csv').resolve()
-    correspondence = read_csv(correspondence_path)
-    tse_codes = correspondence.COD_TSE
+    source_path = Path(presidential_dir,
+                       str(year), 'presidential.csv').resolve()
 
-    interim_dir = Path(data_dir, 'interim').resolve()
-    presidential_dir = Path(interim_dir, 'presidential').resolve()
-    for year in years:
-        logger.info('starting to filter {} data'.format(year))
+    first_turn_dir = Path(interim_dir, 'first_turn').resolve()
+    year_dir = Path(first_turn_dir, str(year)).resolve()
+    file_path = Path(year_dir, 'first_turn.csv').resolve()
+
+    inputs = [interim_path(source_path), correspondence_path]
+    outputs = [interim_path(file_path)]
+    if manifest.is_fresh('first_turn', year, inputs, outputs):
+        return
 
-        file_path = Path(presidential_dir,
-                         str(year), 'presidential.csv').resolve()
-        data = read_csv(file_path)
+    data = read_interim(source_path)
 
-        # Getting votes from 1st turn
-        first_turn = data[data.num_turno == 1]
+    # Getting votes from 1st turn
+    first_turn = data[data.num_turno == 1]
 
-        # Removing votes in transit or outside Brazil
-        first_turn_brazil = first_turn[(first_turn.sigla_uf != 'ZZ') &
-                                       (first_turn.sigla_uf != 'VT')]
-        first_turn_brazil = first_turn_brazil[first_turn_brazil.cod_mun.isin(
-            tse_codes)]
+    # Removing votes in transit or outside Brazil
+    first_turn_brazil = first_turn[(first_turn.sigla_uf != 'ZZ') &
+                                   (first_turn.sigla_uf != 'VT')]
+    first_turn_brazil = first_turn_brazil[first_turn_brazil.cod_mun.isin(
+        tse_codes)]
 
-        first_turn_dir = Path(interim_dir, 'first_turn').resolve()
-        first_turn_dir.mkdir(exist_ok=True)
-        year_dir = Path(first_turn_dir, str(year)).resolve()
-        year_dir.mkdir(exist_ok=True)
+    first_turn_dir.mkdir(exist_ok=True)
+    year_dir.mkdir(exist_ok=True)
 
-        file_path = Path(year_dir, 'first_turn.csv').resolve()
-        first_turn_brazil.to_csv(file_path, index=None)
-        logger.info('finished filtering {} data'.format(year))
+    write_interim(first_turn_brazil, file_path)
+    manifest.record('first_turn', year, inputs, outputs)
+    logger.info('finished filtering {} data'.format(year))
 
 
-def main():
+def make_first_turn_dataset(n_jobs=1):
+    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
+
+    correspondence_path = Path(
+        data_dir, 'external', 'tse-ibge-correspondence.csv').resolve()
+    correspondence = read_csv(correspondence_path)
+    tse_codes = correspondence.COD_TSE
+
+    interim_dir = Path(data_dir, 'interim').resolve()
+    presidential_dir = Path(interim_dir, 'presidential').resolve()
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_first_turn_year_dataset,
+                                interim_dir=interim_dir,
+                                presidential_dir=presidential_dir,
+                                tse_codes=tse_codes,
+                                correspondence_path=correspondence_path,
+                                manifest=manifest)
+    run_tasks(make_year_dataset, years, n_jobs)
+
+
+@click.command()
+@click.option('--n-jobs', type=int, default=1,
+              help='Years processed concurrently.')
+def main(n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -51,7 +79,7 @@ def main():
 
     logger.info(
         'filtering 1st turn data... Saving at ../data/interim/1st_turn')
-    make_first_turn_dataset()
+    make_first_turn_dataset(n_jobs)
     logger.info(
         'done filtering 1st turn data... Saved at ../data/interim/1st_turn')
 
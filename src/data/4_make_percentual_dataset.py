@@ -1,42 +1,174 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv
+import click
+from pandas import read_csv, concat
 
+from src.data.manifest import Manifest
+from src.data.parallel import run_tasks
+from src.data.storage import (interim_path, iter_interim, read_interim,
+                              write_interim)
 
-def make_percentual_dataset():
+
+def make_fused_percentual_year_dataset(year, interim_dir, brazil_dir, columns,
+                                       tse_codes, correspondence_path,
+                                       manifest, chunksize=100000,
+                                       debug_artifacts=False):
+    """ Goes from the brazil datasets straight to percentual ones in a single
+        chunked pass: the cargo, turn, UF and TSE code filters are applied
+        to each chunk as it is parsed and only the running votes per city and
+        party are kept. The presidential and first_turn datasets are written
+        too when debug_artifacts is set, holding their rows in memory.
+    """
+    logger = logging.getLogger(__name__)
+
+    logger.info('starting to filter and transform {} data'.format(year))
+    source_path = Path(brazil_dir, str(year), 'br.csv').resolve()
+
+    percentual_dir = Path(interim_dir, 'percentual').resolve()
+    year_dir = Path(percentual_dir, str(year)).resolve()
+    file_path = Path(year_dir, 'percentual.csv').resolve()
+
+    debug_paths = {
+        name: Path(interim_dir, name, str(year), '{}.csv'.format(name))
+        for name in ['presidential', 'first_turn'] if debug_artifacts
+    }
+    inputs = [interim_path(source_path), correspondence_path]
+    outputs = [interim_path(path)
+               for path in [file_path, *debug_paths.values()]]
+    if manifest.is_fresh('fused_percentual', year, inputs, outputs, columns):
+        return
+
+    votes = None
+    presidential_chunks, first_turn_chunks = [], []
+    for chunk in iter_interim(source_path, columns, chunksize):
+        presidential = chunk[chunk.cod_cargo == 1]
+
+        first_turn = presidential[
+            (presidential.num_turno == 1) &
+            (presidential.sigla_uf != 'ZZ') &
+            (presidential.sigla_uf != 'VT') &
+            presidential.cod_mun.isin(tse_codes)]
+
+        if debug_artifacts:
+            presidential_chunks.append(presidential)
+            first_turn_chunks.append(first_turn)
+
+        # Chunks carry their own categories, so parties are grouped as
+        # plain objects to keep the running sums aligned.
+        chunk_votes = first_turn.groupby(
+            [first_turn.cod_mun, first_turn.sigla_partido.astype(object)]
+        ).qtde_votos_nominais.sum()
+        if votes is None:
+            votes = chunk_votes
+        else:
+            votes = votes.add(chunk_votes, fill_value=0)
+    if votes is None:
+        raise ValueError('No rows to read from {}'.format(source_path))
+
+    votes = votes.sort_index()
+    city_votes = votes.groupby(level='cod_mun').transform('sum')
+    percentual = (votes / city_votes).rename('percentual_votos')
+
+    if debug_artifacts:
+        for name, chunks in [('presidential', presidential_chunks),
+                             ('first_turn', first_turn_chunks)]:
+            debug_paths[name].parent.mkdir(parents=True, exist_ok=True)
+            write_interim(concat(chunks), debug_paths[name])
+
+    percentual_dir.mkdir(exist_ok=True)
+    year_dir.mkdir(exist_ok=True)
+
+    write_interim(percentual, file_path, index=True)
+    manifest.record('fused_percentual', year, inputs, outputs, columns)
+    logger.info('finished filtering and transforming {} data'.format(year))
+
+
+def make_fused_percentual_dataset(chunksize=100000, debug_artifacts=False,
+                                  n_jobs=1):
+    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
+    columns = ['num_turno', 'sigla_uf', 'cod_mun', 'cod_cargo',
+               'sigla_partido', 'qtde_votos_nominais']
+
+    correspondence_path = Path(
+        data_dir, 'external', 'tse-ibge-correspondence.csv').resolve()
+    correspondence = read_csv(correspondence_path)
+    tse_codes = correspondence.COD_TSE
+
+    interim_dir = Path(data_dir, 'interim').resolve()
+    brazil_dir = Path(interim_dir, 'brazil').resolve()
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_fused_percentual_year_dataset,
+                                interim_dir=interim_dir,
+                                brazil_dir=brazil_dir, columns=columns,
+                                tse_codes=tse_codes,
+                                correspondence_path=correspondence_path,
+                                manifest=manifest, chunksize=chunksize,
+                                debug_artifacts=debug_artifacts)
+    run_tasks(make_year_dataset, years, n_jobs)
+
+
+def make_percentual_year_dataset(year, interim_dir, first_turn_dir, manifest):
     logger = logging.getLogger(__name__)
 
+    logger.info('starting to transform {} data'.format(year))
+    source_path = Path(first_turn_dir,
+                       str(year), 'first_turn.csv').resolve()
+
+    percentual_dir = Path(interim_dir, 'percentual').resolve()
+    year_dir = Path(percentual_dir, str(year)).resolve()
+    file_path = Path(year_dir, 'percentual.csv').resolve()
+
+    inputs = [interim_path(source_path)]
+    outputs = [interim_path(file_path)]
+    if manifest.is_fresh('percentual', year, inputs, outputs):
+        return
+
+    data = read_interim(source_path)
+
+    city_group = data.groupby('cod_mun')
+    party_group = data.groupby(['cod_mun', 'sigla_partido'], observed=True)
+    party_group_agg = party_group.agg({'qtde_votos_nominais': sum})
+    city_group_agg = city_group.agg({'qtde_votos_nominais': sum})
+    percentual = party_group_agg / city_group_agg
+    percentual = percentual.rename(
+        columns={'qtde_votos_nominais': 'percentual_votos'})
+
+    percentual_dir.mkdir(exist_ok=True)
+    year_dir.mkdir(exist_ok=True)
+
+    write_interim(percentual, file_path, index=True)
+    manifest.record('percentual', year, inputs, outputs)
+    logger.info('finished transforming {} data'.format(year))
+
+
+def make_percentual_dataset(n_jobs=1):
     years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
 
     interim_dir = Path(data_dir, 'interim').resolve()
     first_turn_dir = Path(interim_dir, 'first_turn').resolve()
-    for year in years:
-        logger.info('starting to transform {} data'.format(year))
-        file_path = Path(first_turn_dir,
-                         str(year), 'first_turn.csv').resolve()
-        data = read_csv(file_path)
-
-        city_group = data.groupby('cod_mun')
-        party_group = data.groupby(['cod_mun', 'sigla_partido'])
-        party_group_agg = party_group.agg({'qtde_votos_nominais': sum})
-        city_group_agg = city_group.agg({'qtde_votos_nominais': sum})
-        percentual = party_group_agg / city_group_agg
-        percentual = percentual.rename(
-            columns={'qtde_votos_nominais': 'percentual_votos'})
-
-        percentual_dir = Path(interim_dir, 'percentual').resolve()
-        percentual_dir.mkdir(exist_ok=True)
-        year_dir = Path(percentual_dir, str(year)).resolve()
-        year_dir.mkdir(exist_ok=True)
-
-        file_path = Path(year_dir, 'percentual.csv').resolve()
-        percentual.to_csv(file_path)
-        logger.info('finished transforming {} data'.format(year))
-
-
-def main():
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_percentual_year_dataset,
+                                interim_dir=interim_dir,
+                                first_turn_dir=first_turn_dir,
+                                manifest=manifest)
+    run_tasks(make_year_dataset, years, n_jobs)
+
+
+@click.command()
+@click.option('--fused', is_flag=True,
+              help='Build percentual data straight from the brazil datasets, '
+              'skipping the presidential and first_turn stages.')
+@click.option('--chunksize', type=int, default=100000,
+              help='Rows read at a time by the fused pass.')
+@click.option('--debug-artifacts', is_flag=True,
+              help='Also write the presidential and first_turn datasets '
+              'from the fused pass.')
+@click.option('--n-jobs', type=int, default=1,
+              help='Years processed concurrently.')
+def main(fused, chunksize, debug_artifacts, n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -44,7 +176,10 @@ def main():
 
     logger.info(
         'transforming absolute votes in percentual votes... Saving at ../data/interim/percentual')
-    make_percentual_dataset()
+    if fused:
+        make_fused_percentual_dataset(chunksize, debug_artifacts, n_jobs)
+    else:
+        make_percentual_dataset(n_jobs)
     logger.info(
         'transforming absolute votes in percentual votes... Saved at ../data/interim/percentual')
 
@@ -1,48 +1,97 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 from pathlib import Path
 
-from pandas import read_csv
+import click
 
+from src.data.manifest import Manifest
+from src.data.parallel import run_tasks
+from src.data.shares import make_shares, write_shares
+from src.data.storage import interim_path, read_interim, write_interim
 
-def make_parties_dataset():
+
+def make_parties_year_dataset(year, parties, percentual_dir, shares_dir,
+                              parties_dir, manifest):
     logger = logging.getLogger(__name__)
 
-    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
-    parties = ['PT', 'PSDB']
+    logger.info('starting to filter {} data'.format(year))
 
-    interim_dir = Path(data_dir, 'interim').resolve()
-    percentual_dir = Path(interim_dir, 'percentual').resolve()
+    source_path = Path(percentual_dir, str(year), 'percentual.csv').resolve()
+    shares_path = Path(shares_dir, str(year), 'shares.csv').resolve()
 
-    parties_dir = Path(interim_dir, 'parties').resolve()
-    parties_dir.mkdir(exist_ok=True)
-    for year in years:
-        logger.info('starting to filter {} data'.format(year))
+    inputs = [interim_path(source_path)]
+    outputs = [interim_path(shares_path)]
+    shares = None
+    if not manifest.is_fresh('shares', year, inputs, outputs):
+        logger.info('starting to compute {} shares'.format(year))
+        shares = make_shares(read_interim(source_path))
+        shares_path.parent.mkdir(parents=True, exist_ok=True)
+        write_shares(shares, shares_path)
+        manifest.record('shares', year, inputs, outputs)
+        logger.info('finished computing {} shares'.format(year))
 
-        year_dir = Path(parties_dir, str(year)).resolve()
-        year_dir.mkdir(exist_ok=True)
+    year_dir = Path(parties_dir, str(year)).resolve()
+    year_dir.mkdir(exist_ok=True)
+    for party in parties:
+        logger.info(
+            'starting to filter {} data from {}'.format(year, party))
 
-        file_path = Path(percentual_dir, str(year), 'percentual.csv').resolve()
-        data = read_csv(file_path)
-        for party in parties:
-            logger.info(
-                'starting to filter {} data from {}'.format(year, party))
+        party_dir = Path(year_dir, party).resolve()
+        file_path = Path(party_dir, 'party.csv').resolve()
 
-            party_dir = Path(year_dir, party).resolve()
-            party_dir.mkdir(exist_ok=True)
+        inputs = [interim_path(shares_path)]
+        outputs = [interim_path(file_path)]
+        key = (year, party)
+        if manifest.is_fresh('parties', key, inputs, outputs):
+            continue
 
-            file_path = Path(party_dir, 'party.csv').resolve()
-            party_data = data[data.sigla_partido == party]
-            party_data = party_data[['cod_mun', 'percentual_votos']]
-            party_data.to_csv(file_path, index=None)
+        if shares is None:
+            shares = read_interim(shares_path)
+        party_dir.mkdir(exist_ok=True)
 
-            logger.info(
-                'finished filtering {} data from {}'.format(year, party))
+        party_data = shares[shares.sigla_partido == party]
+        party_data = party_data[['cod_mun', 'percentual_votos']]
+        write_interim(party_data, file_path)
+        manifest.record('parties', key, inputs, outputs)
 
-        logger.info('finished filtering {} data'.format(year))
+        logger.info(
+            'finished filtering {} data from {}'.format(year, party))
 
+    logger.info('finished filtering {} data'.format(year))
 
-def main():
+
+def make_parties_dataset(parties=('PT', 'PSDB'), n_jobs=1):
+    """ Writes the shares of every party in every municipality as one file
+        per year under interim/shares, and the party.csv of each of parties
+        filtered from them.
+    """
+    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
+
+    interim_dir = Path(data_dir, 'interim').resolve()
+    percentual_dir = Path(interim_dir, 'percentual').resolve()
+    shares_dir = Path(interim_dir, 'shares').resolve()
+
+    parties_dir = Path(interim_dir, 'parties').resolve()
+    parties_dir.mkdir(exist_ok=True)
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    make_year_dataset = partial(make_parties_year_dataset,
+                                parties=list(parties),
+                                percentual_dir=percentual_dir,
+                                shares_dir=shares_dir,
+                                parties_dir=parties_dir,
+                                manifest=manifest)
+    run_tasks(make_year_dataset, years, n_jobs)
+
+
+@click.command()
+@click.option('--party', 'parties', multiple=True, default=['PT', 'PSDB'],
+              show_default=True,
+              help='Party whose party.csv is filtered from the shares, '
+                   'can be repeated.')
+@click.option('--n-jobs', type=int, default=1,
+              help='Years processed concurrently.')
+def main(parties, n_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
@@ -50,7 +99,7 @@ def main():
 
     logger.info(
         'filtering percentual votes to make parties dataset... Saving at ../data/interim/parties')
-    make_parties_dataset()
+    make_parties_dataset(parties, n_jobs)
     logger.info(
         'done filtering percentual votes to make parties dataset... Saved at ../data/interim/parties')
 
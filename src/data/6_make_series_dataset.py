@@ -2,7 +2,10 @@
 import logging
 from pathlib import Path
 
-from pandas import read_csv
+from src.data.manifest import Manifest
+from src.data.series import (make_series, read_shares, series_store_paths,
+                             write_series_store)
+from src.data.storage import interim_path
 
 
 def make_series_dataset():
@@ -16,34 +19,30 @@ def make_series_dataset():
 
     series_dir = Path(interim_dir, 'series').resolve()
     series_dir.mkdir(exist_ok=True)
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+
+    stale = {}
     for party in parties:
-        logger.info('starting to join {} data'.format(party))
-        file_path = Path(parties_dir, '1994', party, 'party.csv').resolve()
-        dataset = read_csv(file_path, index_col=0)
-        dataset = dataset.groupby('cod_mun').sum()
-
-        for year in years[1:]:
-            logger.info('starting to join {} data'.format(year))
-
-            file_path = Path(parties_dir, str(
-                year), party, 'party.csv').resolve()
-            data = read_csv(file_path, index_col=0)
-            data = data.groupby('cod_mun').sum()
-            dataset = dataset.join(
-                data, how='outer', rsuffix='_{}'.format(year))
-            logger.info('done joining {} data'.format(year))
-
-        dataset = dataset.rename(
-            columns={"percentual_votos": "percentual_votos_" + str(years[0])})
-        dataset = dataset.fillna(0)
-        dataset = dataset.sort_index()
-
-        party_dir = Path(series_dir, party).resolve()
-        party_dir.mkdir(exist_ok=True)
-        file_path = Path(party_dir, 'series.csv').resolve()
-        dataset.to_csv(file_path)
-
-        logger.info('done joining {} data'.format(party))
+        destination_path = Path(series_dir, party, 'series').resolve()
+        inputs = [interim_path(Path(parties_dir, str(year), party, 'party.csv'))
+                  for year in years]
+        outputs = list(series_store_paths(destination_path))
+        if not manifest.is_fresh('series', party, inputs, outputs, years):
+            stale[party] = (destination_path, inputs, outputs)
+    if not stale:
+        return
+
+    logger.info('starting to read {} shares'.format(', '.join(stale)))
+    shares = read_shares(parties_dir, list(stale), years)
+    logger.info('done reading shares, pivoting them...')
+    party_series = make_series(shares, years)
+
+    for party, (destination_path, inputs, outputs) in stale.items():
+        destination_path.parent.mkdir(exist_ok=True)
+        write_series_store(party_series[party], years, destination_path)
+        manifest.record('series', party, inputs, outputs, years)
+
+        logger.info('done writing {} series'.format(party))
 
 
 def main():
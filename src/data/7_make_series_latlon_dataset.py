@@ -4,6 +4,10 @@ from pathlib import Path
 
 from pandas import read_csv
 
+from src.data.manifest import Manifest
+from src.data.series import read_series_store, series_store_paths
+from src.data.storage import interim_path, write_interim
+
 
 def make_series_latlon_dataset():
     logger = logging.getLogger(__name__)
@@ -22,18 +26,26 @@ def make_series_latlon_dataset():
 
     latlon_dir = Path(interim_dir, 'latlon').resolve()
     latlon_dir.mkdir(exist_ok=True)
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
     for party in parties:
+        series_path = Path(series_dir, party, 'series').resolve()
+        party_dir = Path(latlon_dir, party).resolve()
+        file_path = Path(party_dir, 'latlon.csv').resolve()
+
+        inputs = [latlon_path, *series_store_paths(series_path)]
+        outputs = [interim_path(file_path)]
+        if manifest.is_fresh('series_latlon', party, inputs, outputs):
+            continue
+
         logger.info('starting to join latlon data')
-        file_path = Path(series_dir, party, 'series.csv').resolve()
-        dataset = read_csv(file_path)
+        dataset = read_series_store(series_path).reset_index()
         dataset.cod_mun = dataset.cod_mun.astype('int')
 
         dataset = dataset.join(latlon, on='cod_mun', how='inner', rsuffix='_')
 
-        party_dir = Path(latlon_dir, party).resolve()
         party_dir.mkdir(exist_ok=True)
-        file_path = Path(party_dir, 'latlon.csv').resolve()
-        dataset.to_csv(file_path, index=False)
+        write_interim(dataset, file_path)
+        manifest.record('series_latlon', party, inputs, outputs)
 
         logger.info('done joining {} data'.format(party))
 
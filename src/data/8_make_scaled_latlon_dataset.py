@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import logging
+from pathlib import Path
+
+import click
+from pandas import concat
+
+from src.data.manifest import Manifest
+from src.data.scaling import DEFAULT_SCALINGS, SCALINGS, scale_coordinates
+from src.data.storage import interim_path, read_interim, write_interim
+
+
+def make_scaled_latlon_dataset(scalings=None):
+    logger = logging.getLogger(__name__)
+
+    parties = ['PT', 'PSDB']
+    scalings = list(scalings or DEFAULT_SCALINGS)
+
+    interim_dir = Path(data_dir, 'interim').resolve()
+    processed_dir = Path(data_dir, 'processed').resolve()
+    latlon_dir = Path(interim_dir, 'latlon').resolve()
+
+    processed_latlon_dir = Path(processed_dir, 'latlon').resolve()
+    processed_latlon_dir.mkdir(exist_ok=True)
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    for party in parties:
+        source_path = Path(latlon_dir, party, 'latlon.csv').resolve()
+        party_dir = Path(processed_latlon_dir, party).resolve()
+        file_path = Path(party_dir, 'latlon.csv').resolve()
+
+        inputs = [interim_path(source_path)]
+        outputs = [interim_path(file_path)]
+        params = {scaling: SCALINGS[scaling] for scaling in scalings}
+        if manifest.is_fresh('scaled_latlon', party, inputs, outputs,
+                             params):
+            continue
+
+        logger.info('starting to scale {} series_latlon data'.format(party))
+
+        dataset = read_interim(source_path)
+        dataset = concat([dataset, scale_coordinates(dataset, scalings)],
+                         axis=1)
+
+        party_dir.mkdir(exist_ok=True)
+        write_interim(dataset, file_path)
+        manifest.record('scaled_latlon', party, inputs, outputs, params)
+
+        logger.info('done scaling {} series_latlon data'.format(party))
+
+
+@click.command()
+@click.option('--scaling', 'scalings', multiple=True,
+              type=click.Choice(list(SCALINGS)),
+              help='Coordinate scaling written as extra columns, can be '
+                   'repeated. Defaults to {}.'.format(
+                       ', '.join(DEFAULT_SCALINGS)))
+def main(scalings):
+    """ Runs data processing scripts to turn series_latlon data from
+        (../interim/latlon) into a dataset with every coordinate scaling
+        as columns (saved in ../processed/latlon).
+    """
+    logger = logging.getLogger(__name__)
+
+    logger.info(
+        'scaling series_latlon dataset... Saving at ../data/processed/latlon')
+    make_scaled_latlon_dataset(scalings)
+    logger.info(
+        'done scaling series_latlon dataset... Saved at ../data/processed/latlon')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = Path(__file__).resolve().parents[2]
+    data_dir = Path(project_dir, 'data').resolve()
+
+    main()
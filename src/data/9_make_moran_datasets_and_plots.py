@@ -2,17 +2,27 @@
 import logging
 from pathlib import Path
 
-from pandas import read_csv, DataFrame
-from geopandas import read_file
-
-from libpysal.weights import Queen
-from esda import Moran, Moran_Local
-
-from splot.esda import plot_moran, plot_local_autocorrelation
-import matplotlib.pyplot as plt
-
-
-def make_moran_datasets_and_plots():
+import click
+from pandas import DataFrame, concat
+
+from src.data.lisa import lisa_frame, lisa_index_path, write_lisa
+from src.data.manifest import Manifest
+from src.data.mesh import read_tse_mesh
+from src.data.moran import (compute_local_moran, compute_moran,
+                             make_global_moran_dataset)
+from src.data.moran_plots import (KINDS, moran_plot_tasks,
+                                   render_moran_plots)
+from src.data.series import read_series, series_store_paths
+from src.data.storage import interim_path, write_interim
+from src.data.weights import queen_weights
+
+
+def make_moran_datasets(permutations=999, seed=None, n_jobs=1):
+    """ Computes the global and local Moran of every party and year without
+        rendering anything. Each party gets its global indexes and p-values,
+        the simulated reference distributions and a long table with the local
+        index, LISA quadrant and pseudo p-value of every municipality.
+    """
     logger = logging.getLogger(__name__)
 
     parties = ['PT', 'PSDB']
@@ -23,94 +33,68 @@ def make_moran_datasets_and_plots():
 
     mesh_path = Path(external_dir, 'cities.json')
     correspondence_path = Path(external_dir, 'tse-ibge-correspondence.csv')
-    mesh = read_file(mesh_path)
-    correspondence = read_csv(correspondence_path)
+    mesh_dir = Path(interim_dir, 'mesh').resolve()
+    mesh = read_tse_mesh(mesh_path, correspondence_path, mesh_dir)
 
-    mesh.CD_GEOCMU = mesh.CD_GEOCMU.astype(int)
-    mesh = mesh.merge(correspondence[['CD_GEOCMU', 'COD_TSE']], how='right')
-    mesh = mesh.set_index('COD_TSE')
-    mesh = mesh.sort_index()
-
-    logger.info('starting to calculate weights...')
-    weights = Queen.from_dataframe(mesh)
-    logger.info(
-        f'done calculating weights')
+    weights_dir = Path(interim_dir, 'weights').resolve()
+    weights = queen_weights(mesh, weights_dir,
+                            [mesh_path, correspondence_path])
 
     years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
 
     moran_dir = Path(data_dir, 'processed', 'moran').resolve()
     moran_dir.mkdir(exist_ok=True)
 
-    moran_plots_dir = Path(project_dir, 'reports', 'moran').resolve()
-    moran_plots_dir.mkdir(exist_ok=True)
-    for party in parties:
-        file_path = Path(series_dir, party, 'series.csv').resolve()
-        dataset = read_csv(file_path)
-        dataset.cod_mun = dataset.cod_mun.astype(int)
-        dataset = dataset.set_index('cod_mun')
-        dataset.index.name = 'COD_TSE'
-        dataset = dataset.sort_index()
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    series_paths = {party: Path(series_dir, party, 'series').resolve()
+                    for party in parties}
+    global_path = Path(moran_dir, 'global_moran.csv').resolve()
+    make_global_moran_dataset(mesh, weights, series_paths, years, global_path,
+                              [mesh_path, correspondence_path], manifest,
+                              'moran')
 
+    for party in parties:
+        file_path = series_paths[party]
         party_dir = Path(moran_dir, party).resolve()
-        party_dir.mkdir(exist_ok=True)
-
-        plots_party_dir = Path(moran_plots_dir, party).resolve()
-        plots_party_dir.mkdir(exist_ok=True)
-        plots_global_dir = Path(plots_party_dir, 'global').resolve()
-        plots_global_dir.mkdir(exist_ok=True)
-        plots_local_dir = Path(plots_party_dir, 'local').resolve()
-        plots_local_dir.mkdir(exist_ok=True)
 
-        dataset.columns = years
+        inputs = [*series_store_paths(file_path), mesh_path,
+                  correspondence_path]
+        outputs = [Path(party_dir, 'p_values.csv').resolve(),
+                   interim_path(Path(party_dir, 'simulations')),
+                   interim_path(Path(party_dir, 'local_moran')),
+                   lisa_index_path(interim_path(
+                       Path(party_dir, 'local_moran')))]
+        params = {'years': years, 'permutations': permutations, 'seed': seed}
+        if manifest.is_fresh('moran', party, inputs, outputs, params):
+            continue
+
+        dataset = read_series(file_path, years)
+        party_dir.mkdir(exist_ok=True)
         merged_mesh = mesh.merge(dataset, on='COD_TSE')
 
         moran_values = []
         p_values = []
+        simulations = DataFrame()
+        local_values = []
 
         for year in years:
 
             logger.info(
-                'starting to calculate global moran\'s index for {} at {}'.format(party, year))
+                'starting to calculate moran\'s indexes for {} at {}'.format(party, year))
 
-            moran = Moran(merged_mesh[year], weights)
+            moran = compute_moran(merged_mesh[year], weights,
+                                  permutations, seed, n_jobs)
             moran_values.append(moran.I)
             p_values.append(moran.p_sim)
+            simulations[str(year)] = moran.sim
 
-            fig, ax = plot_moran(moran, zstandard=True, figsize=(10, 4))
-            ax[0].set_title('Distribuição referência')
-            ax[1].set_title(
-                f'Gráfico de dispersão de Moran ({round(moran.I, 2)})')
-            ax[1].set_ylabel(None)
-            fig.suptitle(f'{party}, {year}')
-
-            plots_year_dir = Path(plots_global_dir, str(year)).resolve()
-            plots_year_dir.mkdir(exist_ok=True)
-            file_path = Path(plots_year_dir, 'global.pdf').resolve()
-            fig.savefig(file_path)
-            plt.close(fig)
-
-            logger.info(
-                'done calculating global moran\'s index for {} at {}'.format(party, year))
-
-            logger.info(
-                'starting to calculate local moran\'s index for {} at {}'.format(party, year))
-
-            local_moran = Moran_Local(merged_mesh[year], weights)
-
-            fig, ax = plot_local_autocorrelation(
-                local_moran, merged_mesh, year)
-            ax[0].set_title('Gráfico de dispersão Moran Local')
-            ax[0].set_ylabel(None)
-            fig.suptitle(f'{party}, {year}')
-
-            plots_year_dir = Path(plots_local_dir, str(year)).resolve()
-            plots_year_dir.mkdir(exist_ok=True)
-            file_path = Path(plots_year_dir, 'local.pdf').resolve()
-            fig.savefig(file_path)
-            plt.close(fig)
+            local_moran = compute_local_moran(
+                merged_mesh[year], weights, permutations, seed, n_jobs)
+            local_values.append(
+                lisa_frame(merged_mesh.index, year, local_moran))
 
             logger.info(
-                'done calculating local moran\'s index for {} at {}'.format(party, year))
+                'done calculating moran\'s indexes for {} at {}'.format(party, year))
 
         p_value_path = Path(party_dir, 'p_values.csv')
         p_value_frame = DataFrame({
@@ -119,33 +103,83 @@ def make_moran_datasets_and_plots():
         }, years)
         p_value_frame.to_csv(p_value_path, index=False)
 
-        fig = plt.figure()
-        ax = plt.subplot()
-        ax.plot(p_value_frame.moran)
-        ax.set_xticklabels([0, 1994, 1998, 2002, 2006, 2010, 2014, 2018])
-        ax.set_title(f'Índice de Moran e p-valores ({party})')
-        ax.set_frame_on(False)
-        ax.tick_params(axis='both', length=0, labelsize=12)
-        for i in range(p_value_frame.shape[0]):
-            ax.annotate(f'{round(p_value_frame.iloc[i, 0], 3)} ({p_value_frame.iloc[i, 1]})', xy=(
-                i, p_value_frame.iloc[i, 0]))
-        # fig.add_axes(ax)
-        fig_path = Path(plots_party_dir, 'moran_values.pdf').resolve()
-        plt.savefig(fig_path)
-        plt.close(fig)
-
-
-def main():
+        write_interim(simulations, Path(party_dir, 'simulations'))
+        write_lisa(concat(local_values, ignore_index=True),
+                   Path(party_dir, 'local_moran'))
+
+        manifest.record('moran', party, inputs, outputs, params)
+
+
+def make_moran_plots(parties=None, kinds=None, plot_years=None, n_jobs=1):
+    """ Renders the requested figures from the results of
+        make_moran_datasets, all of them by default, on n_jobs processes.
+    """
+    parties = parties or ['PT', 'PSDB']
+    kinds = kinds or KINDS
+
+    interim_dir = Path(data_dir, 'interim').resolve()
+    external_dir = Path(data_dir, 'external').resolve()
+    series_dir = Path(interim_dir, 'series').resolve()
+    mesh_paths = (Path(external_dir, 'cities.json'),
+                  Path(external_dir, 'tse-ibge-correspondence.csv'))
+    mesh_dir = Path(interim_dir, 'mesh').resolve()
+    weights_dir = Path(interim_dir, 'weights').resolve()
+
+    years = [1994, 1998, 2002, 2006, 2010, 2014, 2018]
+    plot_years = plot_years or years
+
+    moran_dir = Path(data_dir, 'processed', 'moran').resolve()
+    moran_plots_dir = Path(project_dir, 'reports', 'moran').resolve()
+    moran_plots_dir.mkdir(exist_ok=True)
+
+    manifest = Manifest(Path(data_dir, 'manifest'), __file__)
+    render_moran_plots(moran_plot_tasks(parties, kinds, plot_years), n_jobs,
+                       series_dir=series_dir, moran_dir=moran_dir,
+                       moran_plots_dir=moran_plots_dir, mesh_paths=mesh_paths,
+                       mesh_dir=mesh_dir, weights_dir=weights_dir,
+                       years=years, manifest=manifest, stage='moran_plots')
+
+
+@click.command()
+@click.option('--permutations', type=click.IntRange(min=1), default=999,
+              help='Permutations used for the pseudo p-values.')
+@click.option('--seed', type=int, default=None,
+              help='Seed of the permutations.')
+@click.option('--n-jobs', type=int, default=1,
+              help='Processes sharing the permutations.')
+@click.option('--compute/--no-compute', default=True,
+              help='Compute the moran datasets.')
+@click.option('--render/--no-render', default=True,
+              help='Render the moran plots.')
+@click.option('--party', 'parties', multiple=True,
+              help='Party whose plots are rendered, all by default.')
+@click.option('--kind', 'kinds', multiple=True, type=click.Choice(KINDS),
+              help='Kind of plot rendered, all by default.')
+@click.option('--year', 'plot_years', multiple=True, type=int,
+              help='Year whose plots are rendered, all by default.')
+@click.option('--render-jobs', type=int, default=1,
+              help='Processes rendering plots.')
+def main(permutations, seed, n_jobs, compute, render, parties, kinds,
+         plot_years, render_jobs):
     """ Runs data processing scripts to turn brazil voting data from (../interim) into
         presidential data (saved in ../interim/presidential).
     """
     logger = logging.getLogger(__name__)
 
-    logger.info(
-        'using series data to make moran dataset... Saving at ../reports/moran')
-    make_moran_datasets_and_plots()
-    logger.info(
-        'done making moran dataset... Saved at ../reports/moran')
+    if compute:
+        logger.info(
+            'using series data to make moran dataset... Saving at ../processed/moran')
+        make_moran_datasets(permutations, seed, n_jobs)
+        logger.info(
+            'done making moran dataset... Saved at ../processed/moran')
+
+    if render:
+        logger.info(
+            'using moran dataset to make moran plots... Saving at ../reports/moran')
+        make_moran_plots(list(parties), list(kinds), list(plot_years),
+                         render_jobs)
+        logger.info(
+            'done making moran plots... Saved at ../reports/moran')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from numpy import arange, asarray, concatenate, full, ones
+from pandas import DataFrame, MultiIndex
+from scipy.sparse import csr_matrix
+
+
+def bloc_parties(members, year):
+    """ Returns the parties of a bloc in year. Members are party codes,
+        counted in every year, or dicts with a 'party' and optional
+        'since' and 'until' years, both inclusive, so renames such as
+        PFL to DEM can be written as
+        [{'party': 'PFL', 'until': 2006}, {'party': 'DEM', 'since': 2007}].
+    """
+    parties = []
+    for member in members:
+        if isinstance(member, str):
+            parties.append(member)
+        elif (member.get('since', year) <= year and
+              year <= member.get('until', year)):
+            parties.append(member['party'])
+    return parties
+
+
+def compile_blocs(blocs, parties, year):
+    """ Returns an int array with, for every one of parties, the position in
+        blocs of the bloc it belongs to in year, or -1 when it belongs to
+        none. blocs maps bloc names to their members.
+    """
+    positions = {party: position for position, party in enumerate(parties)}
+    lookup = full(len(parties), -1)
+    for code, members in enumerate(blocs.values()):
+        for party in bloc_parties(members, year):
+            if party not in positions:
+                continue
+            if lookup[positions[party]] >= 0:
+                raise ValueError('Party {} is in more than one bloc in {}'
+                                 .format(party, year))
+            lookup[positions[party]] = code
+    return lookup
+
+
+def bloc_membership(definitions, parties, year):
+    """ Returns the party by bloc sparse matrix of every bloc of every
+        definition in year, the blocs of each definition side by side.
+    """
+    rows, columns = [], []
+    offset = 0
+    for blocs in definitions:
+        lookup = compile_blocs(blocs, parties, year)
+        members = lookup >= 0
+        rows.append(arange(len(parties))[members])
+        columns.append(offset + lookup[members])
+        offset += len(blocs)
+
+    rows = concatenate(rows) if rows else asarray([], dtype=int)
+    columns = concatenate(columns) if columns else asarray([], dtype=int)
+    return csr_matrix((ones(len(rows), dtype='float32'), (rows, columns)),
+                      shape=(len(parties), offset))
+
+
+def aggregate_blocs(matrix, definitions, year):
+    """ Returns the share of every bloc in every municipality of matrix, a
+        municipality by party share frame of year, with a single sparse
+        product however many blocs there are. definitions maps names to
+        bloc definitions, and the columns are (definition, bloc) pairs.
+    """
+    membership = bloc_membership(definitions.values(),
+                                 [str(party) for party in matrix.columns],
+                                 year)
+    values = asarray(matrix.to_numpy(dtype='float32') @ membership)
+    columns = MultiIndex.from_tuples(
+        [(name, bloc) for name, blocs in definitions.items()
+         for bloc in blocs], names=['definition', 'bloc'])
+    return DataFrame(values, index=matrix.index, columns=columns)
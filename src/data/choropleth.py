@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import logging
+from functools import partial
+from pathlib import Path
+
+from matplotlib import pyplot as plt
+from matplotlib.collections import PatchCollection
+from matplotlib.colors import Normalize
+from matplotlib.lines import Line2D
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path as MplPath
+from numpy import asarray, concatenate, full, ma, unique
+from pandas import Index
+from shapely.geometry.polygon import orient
+
+from src.data.parallel import run_tasks
+
+_canvas = {}
+
+
+class MapCanvas:
+    """ Figure holding the polygons of a mesh, converted once to matplotlib
+        paths, optionally simplified to tolerance, in a single collection.
+        Rendering a map only recolors that collection and redraws the
+        legend, so the geometries are not rebuilt for every figure.
+        Colors follow geopandas' categorical plots.
+    """
+
+    def __init__(self, mesh, mesh_key=None, tolerance=None, figsize=None):
+        geometries = mesh.geometry
+        if tolerance:
+            geometries = geometries.simplify(tolerance)
+        self.keys = Index(mesh.index if mesh_key is None else mesh[mesh_key])
+
+        self.figure, self.ax = plt.subplots(figsize=figsize)
+        self.collection = PatchCollection(
+            [PathPatch(_geometry_path(geometry)) for geometry in geometries])
+        self.ax.add_collection(self.collection)
+        self.ax.autoscale_view()
+        self.ax.set_aspect('equal')
+        self.ax.axis(False)
+        self.title = self.figure.suptitle('')
+
+    def render(self, values, file_path, title='', cmap=None, legend=False,
+               legend_kwds=None):
+        """ Paints every polygon with the category of values, indexed like
+            the mesh keys, leaves those without one blank and saves the
+            figure at file_path.
+        """
+        categories, codes = unique(asarray(values), return_inverse=True)
+        positions = Index(values.index).get_indexer(self.keys)
+        mesh_codes = full(len(self.keys), -1)
+        mesh_codes[positions >= 0] = codes.ravel()[positions[positions >= 0]]
+
+        cmap = plt.get_cmap(cmap)
+        norm = Normalize(vmin=0, vmax=len(categories) - 1)
+        self.collection.set_array(ma.masked_less(mesh_codes, 0))
+        self.collection.set_cmap(cmap)
+        self.collection.set_norm(norm)
+
+        if self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+        if legend:
+            patches = [Line2D([0], [0], linestyle='none', marker='o',
+                              markersize=10, markeredgewidth=0,
+                              markerfacecolor=cmap(norm(code)))
+                       for code in range(len(categories))]
+            legend_kwds = dict(legend_kwds or {})
+            legend_kwds.setdefault('numpoints', 1)
+            legend_kwds.setdefault('loc', 'best')
+            self.ax.legend(patches, [str(category) for category in categories],
+                           **legend_kwds)
+
+        self.title.set_text(title)
+        self.figure.savefig(file_path)
+
+    def close(self):
+        plt.close(self.figure)
+
+
+def _geometry_path(geometry):
+    """ Returns one compound path with the rings of all the polygons of
+        geometry, holes included. Polygons are oriented with counter-clockwise
+        exteriors and clockwise holes, so the nonzero fill rule of matplotlib
+        leaves the holes empty.
+    """
+    polygons = [] if geometry is None else getattr(geometry, 'geoms',
+                                                    [geometry])
+    vertices = []
+    codes = []
+    for polygon in polygons:
+        if polygon.is_empty:
+            continue
+        polygon = orient(polygon, 1.0)
+        for ring in [polygon.exterior, *polygon.interiors]:
+            ring_vertices = asarray(ring.coords)[:, :2]
+            ring_codes = full(len(ring_vertices), MplPath.LINETO)
+            ring_codes[0] = MplPath.MOVETO
+            ring_codes[-1] = MplPath.CLOSEPOLY
+            vertices.append(ring_vertices)
+            codes.append(ring_codes)
+    if not vertices:
+        return MplPath(asarray([[0., 0.]]), [MplPath.MOVETO])
+    return MplPath(concatenate(vertices), concatenate(codes))
+
+
+def render_choropleths(figures, mesh_loader, manifest, stage, n_jobs=1,
+                       mesh_key=None, tolerance=None):
+    """ Renders a categorical choropleth of the mesh returned by
+        mesh_loader() for every figure, on a pool of n_jobs processes.
+
+        A figure is a dict with its manifest 'key' and 'inputs', the
+        'values' to paint, indexed like the mesh index or its mesh_key
+        column, the 'file_path' it is saved at, its 'title' and the keyword
+        arguments of MapCanvas.render in 'plot'. Figures whose manifest
+        entry is fresh are skipped before the pool starts. Every worker
+        builds a MapCanvas of the mesh once and only recolors it for each
+        figure.
+    """
+    logger = logging.getLogger(__name__)
+
+    stale = []
+    for figure in figures:
+        figure = dict(figure, params={'title': figure['title'],
+                                      'tolerance': tolerance})
+        if not manifest.is_fresh(stage, figure['key'], figure['inputs'],
+                                 [figure['file_path']], figure['params']):
+            stale.append(figure)
+    if not stale:
+        return
+
+    logger.info('rendering {} of {} maps...'.format(len(stale), len(figures)))
+    render = partial(_render_choropleth, manifest=manifest, stage=stage)
+    run_tasks(render, stale, n_jobs, initializer=_load_canvas,
+              initargs=(mesh_loader, mesh_key, tolerance))
+
+
+def _load_canvas(mesh_loader, mesh_key, tolerance):
+    _canvas['canvas'] = MapCanvas(mesh_loader(), mesh_key, tolerance)
+
+
+def _render_choropleth(figure, manifest, stage):
+    logger = logging.getLogger(__name__)
+
+    Path(figure['file_path']).parent.mkdir(parents=True, exist_ok=True)
+    _canvas['canvas'].render(figure['values'], figure['file_path'],
+                             figure['title'], **figure['plot'])
+
+    logger.info('done rendering {}'.format(figure['file_path']))
+    manifest.record(stage, figure['key'], figure['inputs'],
+                    [figure['file_path']], figure['params'])
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+from pathlib import Path
+
+from numpy import (arange, array, ascontiguousarray, column_stack, inf,
+                   load, maximum, save, savez, sqrt, unique, where, zeros)
+from numpy.random import default_rng
+from pandas import DataFrame
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import cdist
+
+BATCH_SIZE = 4000000
+
+
+def linkage_key(values):
+    """ Hashes the values being clustered together with their shape. """
+    values = ascontiguousarray(values, dtype='float64')
+    digest = hashlib.sha256(str(values.shape).encode())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def ward_linkage(values, cache_dir):
+    """ Returns the Ward linkage of values. It is kept in cache_dir as a
+        .npy keyed by the hash of values, so clustering the same data again,
+        e.g. to cut it at other numbers of clusters, only loads it.
+    """
+    logger = logging.getLogger(__name__)
+
+    values = ascontiguousarray(values, dtype='float64')
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = Path(cache_dir, 'ward_{}.npy'.format(
+        linkage_key(values)[:16]))
+
+    if cache_path.exists():
+        logger.info('loading linkage from {}'.format(cache_path))
+        return load(cache_path, allow_pickle=False)
+
+    logger.info('starting to calculate linkage...')
+    links = linkage(values, method='ward')
+    save(cache_path, links)
+    logger.info('done calculating linkage, cached at {}'.format(cache_path))
+    return links
+
+
+def cut_tree_labels(links, n_clusters_values):
+    """ Returns the municipality by n_clusters int8 matrix of the labels of
+        links cut at each of n_clusters_values.
+    """
+    return column_stack([
+        fcluster(links, n_clusters, criterion='maxclust')
+        for n_clusters in n_clusters_values]).astype('int8')
+
+
+def write_labels(file_path, cod_mun, n_clusters_values, labels):
+    savez(file_path, cod_mun=array(cod_mun, dtype='int32'),
+          n_clusters=array(n_clusters_values, dtype='int16'), labels=labels)
+
+
+def read_labels(file_path):
+    """ Returns the labels written by write_labels indexed by cod_mun, with
+        one column per number of clusters.
+    """
+    with load(file_path, allow_pickle=False) as labels_file:
+        labels = DataFrame(labels_file['labels'],
+                           index=labels_file['cod_mun'],
+                           columns=labels_file['n_clusters'].tolist())
+    labels.index.name = 'cod_mun'
+    return labels
+
+
+def cluster_metrics(values, labels_matrix, n_clusters_values,
+                    sample_size=None, seed=None):
+    """ Returns the silhouette, Calinski-Harabasz and Davies-Bouldin scores
+        of every column of labels_matrix, indexed by n_clusters.
+
+        The distances of each block of rows to all rows are computed once
+        and summed per cluster of every cut with a single product, so the
+        whole sweep takes one pass over the pairwise distances. With a
+        sample_size, the silhouette is averaged over that many rows drawn
+        with seed, each still measured against every row. The other two
+        scores only need the centroids of each cut.
+    """
+    values = ascontiguousarray(values, dtype='float64')
+    n = len(values)
+
+    cuts = [unique(labels, return_inverse=True)[1].ravel()
+            for labels in labels_matrix.T]
+    sizes = [_bincount(codes) for codes in cuts]
+    offsets = [0]
+    for cut_sizes in sizes:
+        offsets.append(offsets[-1] + len(cut_sizes))
+
+    # Membership of every row in the clusters of every cut, side by side
+    memberships = zeros((n, offsets[-1]))
+    for codes, offset in zip(cuts, offsets):
+        memberships[arange(n), offset + codes] = 1
+
+    if sample_size is None or sample_size >= n:
+        rows = arange(n)
+    else:
+        rows = default_rng(seed).choice(n, sample_size, replace=False)
+        rows.sort()
+
+    silhouettes = zeros(len(cuts))
+    batch = max(1, BATCH_SIZE // n)
+    for start in range(0, len(rows), batch):
+        batch_rows = rows[start:start + batch]
+        cluster_sums = cdist(values[batch_rows], values) @ memberships
+        for cut, (codes, cut_sizes) in enumerate(zip(cuts, sizes)):
+            silhouettes[cut] += _silhouette_sum(
+                cluster_sums[:, offsets[cut]:offsets[cut + 1]],
+                codes[batch_rows], cut_sizes)
+    silhouettes /= len(rows)
+
+    scores = []
+    for cut, (codes, cut_sizes) in enumerate(zip(cuts, sizes)):
+        centroids = (memberships[:, offsets[cut]:offsets[cut + 1]].T @
+                     values) / cut_sizes[:, None]
+        scores.append([
+            silhouettes[cut],
+            _calinski_harabasz(values, centroids, cut_sizes),
+            _davies_bouldin(values, codes, centroids)
+        ])
+
+    metrics = DataFrame(
+        scores, index=list(n_clusters_values),
+        columns=['silhouette', 'calinski_harabasz', 'davies_bouldin'])
+    metrics.index.name = 'n_clusters'
+    return metrics
+
+
+def _bincount(codes):
+    return unique(codes, return_counts=True)[1].astype('float64')
+
+
+def _silhouette_sum(cluster_sums, codes, sizes):
+    rows = arange(len(codes))
+    own_sizes = sizes[codes]
+    intra = cluster_sums[rows, codes] / maximum(own_sizes - 1, 1)
+
+    means = cluster_sums / sizes
+    means[rows, codes] = inf
+    nearest = means.min(axis=1)
+
+    denominator = maximum(intra, nearest)
+    silhouettes = where(denominator > 0, (nearest - intra) /
+                        where(denominator > 0, denominator, 1), 0)
+    # Rows alone in their cluster score 0, as in sklearn
+    return where(own_sizes > 1, silhouettes, 0).sum()
+
+
+def _calinski_harabasz(values, centroids, sizes):
+    n, k = len(values), len(sizes)
+    mean = values.mean(axis=0)
+    between = (sizes * ((centroids - mean) ** 2).sum(axis=1)).sum()
+    within = ((values - mean) ** 2).sum() - between
+    if within <= 0:
+        return 1.
+    return between * (n - k) / (within * (k - 1))
+
+
+def _davies_bouldin(values, codes, centroids):
+    k = len(centroids)
+    distances = sqrt(((values - centroids[codes]) ** 2).sum(axis=1))
+    scatter = array([distances[codes == code].mean() for code in range(k)])
+
+    separation = cdist(centroids, centroids)
+    if (scatter == 0).all() or (separation == 0).all():
+        return 0.
+    separation[separation == 0] = inf
+    ratios = (scatter[:, None] + scatter[None, :]) / separation
+    return ratios.max(axis=1).mean()
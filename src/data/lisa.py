@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import json
+from pathlib import Path
+
+from numpy import (arange, concatenate, cumsum, isin, searchsorted, unique,
+                   zeros)
+from pandas import DataFrame, read_csv
+
+from src.data.storage import (get_interim_format, interim_path,
+                              write_interim_chunks)
+
+QUADRANTS = {'HH': 1, 'LH': 2, 'LL': 3, 'HL': 4}
+
+LISA_DTYPES = {
+    'COD_TSE': 'int32',
+    'year': 'int16',
+    'Is': 'float32',
+    'quadrant': 'int8',
+    'p_sim': 'float32'
+}
+
+
+def lisa_frame(cod_tse, year, local_moran):
+    """ Returns the local index, quadrant and pseudo p-value of every
+        municipality of local_moran, keyed by COD_TSE and year.
+    """
+    return DataFrame({
+        'COD_TSE': cod_tse,
+        'year': year,
+        'Is': local_moran.Is,
+        'quadrant': local_moran.q,
+        'p_sim': local_moran.p_sim
+    }).astype(LISA_DTYPES)
+
+
+def lisa_index_path(file_path):
+    return Path(file_path).with_suffix('.json')
+
+
+def write_lisa(frame, file_path, interim_format=None):
+    """ Writes LISA rows sorted by year, quadrant and p-value, one block of
+        rows per (year, quadrant). The row range and the COD_TSE codes of
+        every block are kept in a json index next to the file, so lookups
+        only read their rows. Returns the paths of the data file and of the
+        index.
+    """
+    frame = frame.astype(LISA_DTYPES).sort_values(
+        ['year', 'quadrant', 'p_sim'])
+
+    blocks = []
+    index = []
+    start = 0
+    for (year, quadrant), block in frame.groupby(['year', 'quadrant']):
+        blocks.append(block)
+        index.append({'year': int(year), 'quadrant': int(quadrant),
+                      'start': start, 'stop': start + len(block),
+                      'cod_tse': [int(code) for code in block.COD_TSE]})
+        start += len(block)
+
+    file_path = write_interim_chunks(blocks, file_path, interim_format)
+    index_path = lisa_index_path(file_path)
+    with open(index_path, 'w') as index_file:
+        json.dump(index, index_file)
+    return file_path, index_path
+
+
+def read_lisa(file_path, year=None, quadrant=None, p_value=None,
+              cod_tse=None, interim_format=None):
+    """ Returns the LISA rows of year and quadrant, given as 'HH', 'LH',
+        'LL', 'HL' or their codes, whose pseudo p-value is below p_value,
+        of the municipalities of cod_tse, a code or a list of them. Any of
+        them left as None is not filtered on.
+    """
+    interim_format = get_interim_format(interim_format)
+    file_path = interim_path(file_path, interim_format)
+    if isinstance(quadrant, str):
+        quadrant = QUADRANTS[quadrant]
+
+    with open(lisa_index_path(file_path)) as index_file:
+        index = json.load(index_file)
+
+    rows = [zeros(0, dtype='int64')]
+    for block in index:
+        if ((year is not None and block['year'] != year) or
+                (quadrant is not None and block['quadrant'] != quadrant)):
+            continue
+        block_rows = arange(block['start'], block['stop'])
+        if cod_tse is not None:
+            block_rows = block_rows[isin(block['cod_tse'], cod_tse)]
+        rows.append(block_rows)
+    rows = concatenate(rows)
+
+    frame = _read_rows(file_path, rows, interim_format)
+    frame = frame.astype(LISA_DTYPES)
+    if p_value is not None:
+        frame = frame[frame.p_sim < p_value]
+    return frame.reset_index(drop=True)
+
+
+def query_lisa(moran_dir, party, year=None, quadrant=None, p_value=None,
+               cod_tse=None, file_name='local_moran'):
+    """ Returns the LISA rows of party stored under moran_dir, e.g. the
+        HH clusters of PT in 2006 with p < 0.01 are
+        query_lisa(moran_dir, 'PT', 2006, 'HH', 0.01).
+    """
+    return read_lisa(Path(moran_dir, party, file_name), year, quadrant,
+                     p_value, cod_tse)
+
+
+def _read_rows(file_path, rows, interim_format):
+    """ Reads the rows of file_path at the sorted positions rows in a
+        single pass over the file.
+    """
+    if interim_format == 'csv':
+        if not len(rows):
+            return read_csv(file_path, nrows=0)
+        keep = zeros(rows[-1] + 1, dtype=bool)
+        keep[rows] = True
+        return read_csv(file_path, nrows=len(rows),
+                        skiprows=lambda row: (0 < row <= len(keep) and
+                                              not keep[row - 1]))
+
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if interim_format == 'feather':
+        table = feather.read_table(str(file_path), memory_map=True)
+        return table.take(rows).to_pandas()
+
+    parquet_file = pq.ParquetFile(str(file_path))
+    offsets = cumsum([0] + [parquet_file.metadata.row_group(group).num_rows
+                            for group in range(parquet_file.num_row_groups)])
+    row_groups = searchsorted(offsets, rows, side='right') - 1
+    groups = unique(row_groups)
+    table = parquet_file.read_row_groups(groups.tolist())
+    # Position of the rows in the table made of the groups read
+    sizes = offsets[groups + 1] - offsets[groups]
+    starts = cumsum(sizes) - sizes
+    positions = (rows - offsets[row_groups] +
+                 starts[searchsorted(groups, row_groups)])
+    return table.take(positions).to_pandas()
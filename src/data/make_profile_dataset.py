@@ -2,10 +2,120 @@
 import logging
 from pathlib import Path
 
-from pandas import read_csv, get_dummies
+import click
+from numpy import arange, concatenate, ones, where
+from pandas import Categorical, DataFrame, Index, read_csv, get_dummies
+from scipy.sparse import csr_matrix
 
+from src.data.schema import (PROFILE_COLUMNS_TO_USE, PROFILE_DTYPES,
+                             PROFILE_LAYOUTS, read_options)
 
-def make_profile_dataset():
+
+def normalize_categories(column):
+    """ Strips, joins with underscores and uppercases the categories of a
+        categorical column, once per category instead of once per row.
+    """
+    normalized = column.cat.categories.str.strip().str.replace(
+        ' ', '_').str.upper()
+    categories = Index(sorted(set(normalized)))
+    codes = categories.get_indexer(normalized)[column.cat.codes]
+    codes = where(column.cat.codes >= 0, codes, -1)
+    return Categorical.from_codes(codes, categories)
+
+
+def profile_sums(dataset, sparse=False):
+    """ Returns the voters of every category of the categorical columns and
+        the total of voters, both summed by CD_MUNICIPIO. The dummy matrix is
+        weighted by QT_ELEITORES_PERFIL once and summed with a single groupby,
+        or, when sparse is set, built as a csr matrix from the category codes
+        and summed by a product with the municipality indicator matrix.
+    """
+    voters = dataset.QT_ELEITORES_PERFIL.astype('int64')
+    categorical = dataset.select_dtypes(include='category')
+    municipalities = dataset.CD_MUNICIPIO
+
+    if sparse:
+        weighted = _sparse_weighted_sums(categorical, voters, municipalities)
+    else:
+        dummies = get_dummies(categorical)
+        weighted = dummies.multiply(voters, axis=0).groupby(
+            municipalities).sum()
+
+    totals = voters.groupby(municipalities).sum()
+    return weighted, totals
+
+
+def divide_profile(weighted, totals):
+    profile = weighted.div(totals, axis=0)
+    profile.insert(0, 'QT_ELEITORES_PERFIL', totals.astype('float64'))
+    return profile
+
+
+def aggregate_profile(dataset, sparse=False):
+    """ Aggregates voter profile rows into one row per CD_MUNICIPIO holding
+        the total of voters and, for every category, its share of the voters.
+    """
+    return divide_profile(*profile_sums(dataset, sparse))
+
+
+def stream_profile(chunks, sparse=False):
+    """ Aggregates voter profile rows coming in chunks, keeping only the
+        running sums by municipality and category. Each chunk has its own
+        categories, normalized once per value, so the columns are aligned as
+        they are added and put back in the order of a whole file read.
+    """
+    weighted, totals = None, None
+    categories = {}
+    for chunk in chunks:
+        for column in chunk.select_dtypes(include='category'):
+            chunk[column] = normalize_categories(chunk[column])
+            categories.setdefault(column, set()).update(
+                chunk[column].cat.categories)
+
+        chunk_weighted, chunk_totals = profile_sums(chunk, sparse)
+        if weighted is None:
+            weighted, totals = chunk_weighted, chunk_totals
+        else:
+            weighted = weighted.add(chunk_weighted, fill_value=0)
+            totals = totals.add(chunk_totals, fill_value=0)
+    if weighted is None:
+        raise ValueError('No voter profile rows to aggregate')
+
+    columns = ['{}_{}'.format(column, category)
+               for column in categories
+               for category in sorted(categories[column])]
+    # Cells missing on both sides of an add are left as NaN by fill_value,
+    # e.g. a municipality of an early chunk and a category of a later one.
+    weighted = weighted.reindex(columns=columns).fillna(0)
+    totals = totals.fillna(0)
+    return divide_profile(weighted.sort_index(), totals.sort_index())
+
+
+def _sparse_weighted_sums(categorical, voters, municipalities):
+    rows = arange(len(categorical))
+    row_indices, column_indices, data, columns = [], [], [], []
+    for column in categorical:
+        codes = categorical[column].cat.codes.to_numpy()
+        observed = codes >= 0
+        row_indices.append(rows[observed])
+        column_indices.append(codes[observed] + len(columns))
+        data.append(voters.to_numpy()[observed])
+        columns.extend('{}_{}'.format(column, category)
+                       for category in categorical[column].cat.categories)
+    weighted_dummies = csr_matrix(
+        (concatenate(data),
+         (concatenate(row_indices), concatenate(column_indices))),
+        shape=(len(categorical), len(columns)))
+
+    codes, index = municipalities.factorize(sort=True)
+    indicator = csr_matrix((ones(len(rows), dtype='int64'), (codes, rows)),
+                           shape=(len(index), len(categorical)))
+    sums = (indicator @ weighted_dummies).toarray()
+    return DataFrame(sums, index=Index(index, name=municipalities.name),
+                     columns=columns)
+
+
+def make_profile_dataset(sparse=False, stream=False, chunksize=100000):
     logger = logging.getLogger(__name__)
 
     correspondence_path = Path(
@@ -17,53 +127,14 @@ def make_profile_dataset():
     processed_profiles_dir = Path(data_dir, 'processed', 'profiles').resolve()
     processed_profiles_dir.mkdir(exist_ok=True)
 
-    columns_pre_2018 = ['PERIODO', 'UF',
-                        'MUNICIPIO', 'CD_MUNICIPIO', 'NR_ZONA', 'DS_GENERO', 'DS_FAIXA_ETARIA', 'DS_GRAU_ESCOLARIDADE', 'QT_ELEITORES_PERFIL']
-    columns_2018 = ['DT_GERACAO', 'HH_GERACAO', 'ANO_ELEICAO', 'SG_UF', 'CD_MUNICIPIO',
-                    'NM_MUNICIPIO', 'CD_MUN_SIT_BIOMETRIA', 'DS_MUN_SIT_BIOMETRIA',
-                    'NR_ZONA', 'CD_GENERO', 'DS_GENERO', 'CD_ESTADO_CIVIL',
-                    'DS_ESTADO_CIVIL', 'CD_FAIXA_ETARIA', 'DS_FAIXA_ETARIA',
-                    'CD_GRAU_ESCOLARIDADE', 'DS_GRAU_ESCOLARIDADE', 'QT_ELEITORES_PERFIL',
-                    'QT_ELEITORES_BIOMETRIA', 'QT_ELEITORES_DEFICIENCIA',
-                    'QT_ELEITORES_INC_NM_SOCIAL']
-    columns_to_use = ['CD_MUNICIPIO', 'DS_GENERO',
-                      'DS_FAIXA_ETARIA', 'DS_GRAU_ESCOLARIDADE', 'QT_ELEITORES_PERFIL']
     metadata_by_year = {
-        # 1994: {
-        #     'file_extension': 'txt',
-        #     'columns': columns_pre_2018,
-        #     'header': None
-        # },
-        1998: {
-            'file_extension': 'txt',
-            'columns': columns_pre_2018,
-            'header': None
-        },
-        2002: {
-            'file_extension': 'txt',
-            'columns': columns_pre_2018,
-            'header': None
-        },
-        2006: {
-            'file_extension': 'txt',
-            'columns': columns_pre_2018,
-            'header': None
-        },
-        2010: {
-            'file_extension': 'txt',
-            'columns': columns_pre_2018,
-            'header': None
-        },
-        2014: {
-            'file_extension': 'txt',
-            'columns': columns_pre_2018,
-            'header': None
-        },
-        2018: {
-            'file_extension': 'csv',
-            'columns': columns_2018,
-            'header': 0
-        }
+        # 1994: PROFILE_LAYOUTS['pre_2018'],
+        1998: PROFILE_LAYOUTS['pre_2018'],
+        2002: PROFILE_LAYOUTS['pre_2018'],
+        2006: PROFILE_LAYOUTS['pre_2018'],
+        2010: PROFILE_LAYOUTS['pre_2018'],
+        2014: PROFILE_LAYOUTS['pre_2018'],
+        2018: PROFILE_LAYOUTS['2018']
     }
 
     for year in metadata_by_year:
@@ -71,21 +142,25 @@ def make_profile_dataset():
         file_path = Path(
             profiles_dir, f'perfil_eleitorado_{year}', f'perfil_eleitorado_{year}.{metadata_by_year[year]["file_extension"]}')
 
+        options, names = read_options(metadata_by_year[year], PROFILE_DTYPES,
+                                      PROFILE_COLUMNS_TO_USE)
         dataset = read_csv(file_path,
                            encoding='latin',
-                           sep=';', names=metadata_by_year[year]['columns'],
-                           usecols=columns_to_use,
-                           header=metadata_by_year[year]['header'],
-                           na_values='INFORMAÇÃO NÃO RECUPERADA')
+                           sep=';',
+                           na_values='INFORMAÇÃO NÃO RECUPERADA',
+                           chunksize=chunksize if stream else None,
+                           **options)
 
-        object_df = dataset.select_dtypes(include='object')
-        dataset.loc[:, object_df.columns] = object_df.apply(
-            lambda column: column.str.strip().str.replace(' ', '_').str.upper())
+        if stream:
+            dataset = stream_profile(
+                (chunk.set_axis(names, axis=1) for chunk in dataset), sparse)
+        else:
+            dataset.columns = names
 
-        dataset = get_dummies(dataset).groupby('CD_MUNICIPIO').apply(lambda group: group.apply(lambda column: ((
-            column * group.QT_ELEITORES_PERFIL).sum() / group.QT_ELEITORES_PERFIL.sum()) if column.name != 'QT_ELEITORES_PERFIL' else column.sum()))
+            for column in dataset.select_dtypes(include='category'):
+                dataset[column] = normalize_categories(dataset[column])
 
-        dataset = dataset.drop(columns='CD_MUNICIPIO')
+            dataset = aggregate_profile(dataset, sparse)
         dataset = dataset.loc[dataset.index.intersection(correspondence.index)]
         dataset.index.name = 'CD_MUNICIPIO'
         dataset.reset_index()
@@ -98,7 +173,15 @@ def make_profile_dataset():
         logger.info('done creating {} profile data'.format(year))
 
 
-def main():
+@click.command()
+@click.option('--sparse/--dense', default=False,
+              help='Build the category dummies as a sparse matrix.')
+@click.option('--stream/--batch', default=False,
+              help='Read each profile file in chunks, keeping only the sums '
+              'by municipality in memory.')
+@click.option('--chunksize', type=int, default=100000,
+              help='Rows read at a time when streaming.')
+def main(sparse, stream, chunksize):
     """ Runs data processing scripts to turn brazil voting data from (../processed) into
         profile data (saved in ../processed/profile).
     """
@@ -106,7 +189,7 @@ def main():
 
     logger.info(
         'creating profile dataset... Saving at ../data/processed/profile')
-    make_profile_dataset()
+    make_profile_dataset(sparse, stream, chunksize)
     logger.info(
         'done creating profile dataset... Saved at ../data/processed/profile')
 
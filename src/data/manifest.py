@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import ast
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+
+def file_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_inputs(script):
+    """ Returns the path of script and of every src.data module it imports,
+        directly or through other modules, so editing shared code makes
+        the stages built with it stale.
+    """
+    found = set()
+    pending = [Path(script).resolve()]
+    while pending:
+        file_path = pending.pop()
+        if file_path in found:
+            continue
+        found.add(file_path)
+        pending.extend(_imported_modules(file_path))
+    return sorted(found)
+
+
+def _imported_modules(file_path):
+    with open(file_path, 'rb') as source:
+        tree = ast.parse(source.read(), str(file_path))
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.append(node.module)
+            names.extend('{}.{}'.format(node.module, alias.name)
+                         for alias in node.names)
+
+    project_dir = Path(__file__).resolve().parents[2]
+    paths = [Path(project_dir, *name.split('.')).with_suffix('.py')
+             for name in names if name.startswith('src.data.')]
+    return [path for path in paths if path.exists()]
+
+
+class Manifest:
+    """ Build manifest kept as one json file per (stage, key) under
+        manifest_dir, so stages running years in parallel never write the
+        same file. An entry records the hashes of the inputs and outputs and
+        the parameters of a build; it is fresh while all of them still match.
+        File hashes are only recomputed when size or mtime changed. Given
+        the script of the stage, the code it runs, see code_inputs, is an
+        input of every entry. Setting the FORCE_REBUILD environment variable
+        makes every entry stale.
+    """
+
+    def __init__(self, manifest_dir, script=None, force=None):
+        self.manifest_dir = Path(manifest_dir)
+        self.code = code_inputs(script) if script else []
+        if force is None:
+            force = bool(os.environ.get('FORCE_REBUILD'))
+        self.force = force
+
+    def entry_path(self, stage, key):
+        if not isinstance(key, (list, tuple)):
+            key = [key]
+        file_name = '_'.join(str(part) for part in key) or 'all'
+        return Path(self.manifest_dir, stage, file_name + '.json')
+
+    def stage_inputs(self, inputs):
+        """ Returns inputs followed by the code of the stage, once each. """
+        return list(dict.fromkeys(str(path)
+                                  for path in [*inputs, *self.code]))
+
+    def is_fresh(self, stage, key, inputs, outputs, params=None):
+        if self.force:
+            return False
+        inputs = self.stage_inputs(inputs)
+
+        entry_path = self.entry_path(stage, key)
+        if not entry_path.exists():
+            return False
+        with open(entry_path) as entry_file:
+            entry = json.load(entry_file)
+
+        if entry['params'] != _normalize(params):
+            return False
+        for kind, paths in [('inputs', inputs), ('outputs', outputs)]:
+            recorded = entry[kind]
+            if sorted(recorded) != sorted(str(path) for path in paths):
+                return False
+            if not all(_matches(path, recorded[str(path)]) for path in paths):
+                return False
+        logging.getLogger(__name__).info(
+            'skipping {} {}, up to date'.format(stage, key))
+        return True
+
+    def record(self, stage, key, inputs, outputs, params=None):
+        inputs = self.stage_inputs(inputs)
+        entry = {
+            'params': _normalize(params),
+            'inputs': {str(path): _stat_hash(path) for path in inputs},
+            'outputs': {str(path): _stat_hash(path) for path in outputs}
+        }
+        entry_path = self.entry_path(stage, key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(entry_path, 'w') as entry_file:
+            json.dump(entry, entry_file, indent=2, sort_keys=True)
+
+
+def _normalize(params):
+    # Round trip through json so tuples and lists compare equal
+    return json.loads(json.dumps(params, sort_keys=True, default=str))
+
+
+def _stat_hash(file_path):
+    stat = os.stat(file_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_hash(file_path)
+    }
+
+
+def _matches(file_path, recorded):
+    if not os.path.exists(file_path):
+        return False
+    stat = os.stat(file_path)
+    if stat.st_size != recorded['size']:
+        return False
+    if stat.st_mtime_ns == recorded['mtime_ns']:
+        return True
+    return file_hash(file_path) == recorded['sha256']
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from geopandas import GeoDataFrame, read_file
+from pandas import read_csv, read_parquet
+from shapely import wkb
+
+from src.data.manifest import file_hash
+from src.data.storage import temporary_path
+
+_meshes = {}
+_hashes = {}
+
+
+def read_mesh(mesh_path, cache_dir):
+    """ Returns the municipality mesh of mesh_path with CD_GEOCMU as int. """
+    return _cached_mesh([mesh_path], cache_dir, lambda: _build_mesh(mesh_path))
+
+
+def read_tse_mesh(mesh_path, correspondence_path, cache_dir):
+    """ Returns the municipality mesh joined with the TSE-IBGE
+        correspondence, indexed and sorted by COD_TSE.
+    """
+    def build():
+        correspondence = read_csv(correspondence_path)
+        mesh = _build_mesh(mesh_path)
+        mesh = mesh.merge(correspondence[['CD_GEOCMU', 'COD_TSE']],
+                          how='right')
+        mesh = mesh.set_index('COD_TSE')
+        return mesh.sort_index()
+
+    return _cached_mesh([mesh_path, correspondence_path], cache_dir, build)
+
+
+def source_hash(source):
+    """ Returns the sha256 of the file source, memoized for the process on
+        its path, size and mtime, so a mesh file is only read and hashed
+        again when it changes.
+    """
+    stat = os.stat(source)
+    stamp = (str(Path(source).resolve()), stat.st_size, stat.st_mtime_ns)
+    if stamp not in _hashes:
+        _hashes[stamp] = file_hash(source)
+    return _hashes[stamp]
+
+
+def _build_mesh(mesh_path):
+    mesh = read_file(mesh_path)
+    mesh.CD_GEOCMU = mesh.CD_GEOCMU.astype(int)
+    return mesh
+
+
+def _write_mesh_file(mesh, file_path):
+    """ Writes mesh as parquet with its geometries as WKB, which geopandas
+        0.5 cannot do by itself, and its crs in a json next to it. Both are
+        written to temporary files and moved in place, the json first, so
+        a process seeing the parquet always reads complete files.
+    """
+    crs = mesh.crs
+    if hasattr(crs, 'to_wkt'):
+        crs = crs.to_wkt()
+
+    frame = mesh.drop(columns=mesh.geometry.name)
+    frame[mesh.geometry.name] = [
+        None if geometry is None else wkb.dumps(geometry)
+        for geometry in mesh.geometry]
+    crs_path = Path(file_path).with_suffix('.json')
+    temporary_crs_path = temporary_path(crs_path)
+    with open(temporary_crs_path, 'w') as crs_file:
+        json.dump({'crs': crs, 'geometry': mesh.geometry.name},
+                  crs_file)
+    os.replace(temporary_crs_path, crs_path)
+
+    temporary_file_path = temporary_path(file_path)
+    frame.to_parquet(temporary_file_path)
+    os.replace(temporary_file_path, file_path)
+
+
+def _read_mesh_file(file_path):
+    with open(Path(file_path).with_suffix('.json')) as crs_file:
+        metadata = json.load(crs_file)
+    frame = read_parquet(file_path)
+    geometry = metadata['geometry']
+    frame[geometry] = [None if value is None else wkb.loads(value)
+                       for value in frame[geometry]]
+    return GeoDataFrame(frame, geometry=geometry, crs=metadata['crs'])
+
+
+def _cached_mesh(sources, cache_dir, build):
+    """ Meshes are kept as WKB parquet files in cache_dir, keyed by the
+        hashes of the files they are built from, and memoized for the
+        process, so the GeoJSON is only parsed when one of them changes.
+    """
+    logger = logging.getLogger(__name__)
+
+    digest = hashlib.sha256()
+    for source in sources:
+        digest.update(source_hash(source).encode())
+    key = digest.hexdigest()[:16]
+
+    if key not in _meshes:
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_path = Path(cache_dir, 'mesh_{}.parquet'.format(key))
+        if cache_path.exists():
+            logger.info('loading mesh from {}'.format(cache_path))
+            _meshes[key] = _read_mesh_file(cache_path)
+        else:
+            logger.info('starting to build mesh...')
+            _meshes[key] = build()
+            _write_mesh_file(_meshes[key], cache_path)
+            logger.info('done building mesh, cached at {}'.format(cache_path))
+    return _meshes[key].copy()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from numpy import (argpartition, argsort, concatenate, einsum, minimum, sqrt,
+                   take_along_axis, unique, vstack, where, zeros)
+from numpy.random import SeedSequence, default_rng
+from pandas import DataFrame, concat
+from scipy.stats import norm
+
+from esda import Moran, Moran_Local
+
+from src.data.series import read_series, series_store_paths
+
+PERMUTATIONS_PER_TASK = 1000
+BATCH_SIZE = 4000000
+
+
+def moran_matrix(values, weights, transformation='r', two_tailed=True):
+    """ Returns the global Moran of every column of values, a municipality
+        by series frame sharing the weights, with the expected value and the
+        variances, z-scores and p-values under normality and randomization,
+        as esda computes them. All columns are standardized together and
+        lagged with a single sparse product. The transformation is only
+        applied while computing, weights keeps its own.
+    """
+    original = weights.transform
+    weights.transform = transformation
+    try:
+        n = len(values)
+        s0, s1, s2 = weights.s0, weights.s1, weights.s2
+        z = values.to_numpy(dtype='float64')
+        z = z - z.mean(axis=0)
+        lag = weights.sparse @ z
+    finally:
+        weights.transform = original
+    squares = (z ** 2).sum(axis=0)
+    moran = n / s0 * (z * lag).sum(axis=0) / squares
+
+    expected = -1. / (n - 1)
+    variance_norm = ((n ** 2 * s1 - n * s2 + 3 * s0 ** 2) /
+                     ((n - 1) * (n + 1) * s0 ** 2) - expected ** 2)
+
+    kurtosis = ((z ** 4).sum(axis=0) / n) / (squares / n) ** 2
+    a = n * ((n ** 2 - 3 * n + 3) * s1 - n * s2 + 3 * s0 ** 2)
+    b = kurtosis * ((n ** 2 - n) * s1 - 2 * n * s2 + 6 * s0 ** 2)
+    variance_rand = ((a - b) / ((n - 1) * (n - 2) * (n - 3) * s0 ** 2) -
+                     expected ** 2)
+
+    result = DataFrame({'I': moran, 'EI': expected}, index=values.columns)
+    tails = 2. if two_tailed else 1.
+    for name, variance in [('norm', variance_norm), ('rand', variance_rand)]:
+        result['VI_' + name] = variance
+        result['seI_' + name] = sqrt(variance)
+        result['z_' + name] = (moran - expected) / result['seI_' + name]
+        result['p_' + name] = tails * norm.sf(abs(result['z_' + name]))
+    return result
+
+
+def make_global_moran_dataset(mesh, weights, series_paths, years, global_path,
+                              inputs, manifest, stage):
+    """ Computes the analytical global Moran of every party and year at
+        once, as columns of a single matrix lagged by one sparse product,
+        and writes it at global_path under the manifest entry (stage,
+        'global'). series_paths maps parties to their series stores.
+    """
+    logger = logging.getLogger(__name__)
+
+    inputs = [store_path for path in series_paths.values()
+              for store_path in series_store_paths(path)] + inputs
+    params = {'years': years}
+    if manifest.is_fresh(stage, 'global', inputs, [global_path], params):
+        return
+
+    logger.info('starting to calculate global moran\'s indexes...')
+    values = concat({party: read_series(path, years, mesh.index)
+                     for party, path in series_paths.items()}, axis=1)
+    values.columns.names = ['party', 'year']
+    moran_matrix(values, weights).to_csv(global_path)
+    logger.info('done calculating global moran\'s indexes, saved at {}'.format(
+        global_path))
+
+    manifest.record(stage, 'global', inputs, [global_path], params)
+
+
+def compute_moran(y, weights, permutations=999, seed=None, n_jobs=1):
+    """ Returns the global Moran of y, with its permutation inference run in
+        batches of permuted vectors lagged by one sparse product each and
+        spread over n_jobs processes. Results only depend on the seed and
+        the number of permutations, not on n_jobs.
+    """
+    moran = Moran(y, weights, permutations=0)
+    moran.permutations = permutations
+    if not permutations:
+        return moran
+
+    adjacency = moran.w.sparse.tocsr()
+    # Recent esda versions standardize z after computing I
+    scaling = moran.n / moran.w.s0 / (moran.z ** 2).sum()
+    tasks = _tasks(permutations, seed)
+    sims = _run(_global_sims, tasks, n_jobs, moran.z, adjacency, scaling)
+    sim = concatenate(sims)
+
+    larger = (sim >= moran.I).sum()
+    if permutations - larger < larger:
+        larger = permutations - larger
+    moran.sim = sim
+    moran.p_sim = (larger + 1.) / (permutations + 1.)
+    moran.EI_sim = sim.mean()
+    moran.seI_sim = sim.std()
+    moran.VI_sim = moran.seI_sim ** 2
+    moran.z_sim = (moran.I - moran.EI_sim) / moran.seI_sim
+    moran.p_z_sim = norm.sf(abs(moran.z_sim))
+    return moran
+
+
+def compute_local_moran(y, weights, permutations=999, seed=None, n_jobs=1,
+                        keep_simulations=False):
+    """ Returns the local Moran of y with conditional randomization: every
+        permutation draws one set of ids shared by all observations, which
+        are grouped by number of neighbours so each group is lagged with a
+        single product. Permutations are spread over n_jobs processes and
+        only their counts and moments come back unless keep_simulations.
+    """
+    local_moran = Moran_Local(y, weights, permutations=0)
+    local_moran.permutations = permutations
+    if not permutations:
+        return local_moran
+
+    adjacency = local_moran.w.sparse.tocsr()
+    scaling = local_moran.n_1 / local_moran.den
+    tasks = _tasks(permutations, seed)
+    chunks = _run(_local_sims, tasks, n_jobs, local_moran.z, adjacency,
+                  scaling, local_moran.Is, keep_simulations)
+
+    larger = sum(chunk[0] for chunk in chunks)
+    total = sum(chunk[1] for chunk in chunks)
+    squares = sum(chunk[2] for chunk in chunks)
+
+    larger = minimum(larger, permutations - larger)
+    local_moran.p_sim = (larger + 1.) / (permutations + 1.)
+    local_moran.sim = (vstack([chunk[3] for chunk in chunks])
+                       if keep_simulations else None)
+    local_moran.rlisas = local_moran.sim
+    local_moran.EI_sim = total / permutations
+    local_moran.VI_sim = squares / permutations - local_moran.EI_sim ** 2
+    local_moran.seI_sim = sqrt(local_moran.VI_sim.clip(0))
+    with_variance = local_moran.seI_sim > 0
+    local_moran.z_sim = where(
+        with_variance,
+        (local_moran.Is - local_moran.EI_sim) /
+        where(with_variance, local_moran.seI_sim, 1),
+        0)
+    local_moran.p_z_sim = norm.sf(abs(local_moran.z_sim))
+    return local_moran
+
+
+def _tasks(permutations, seed):
+    sizes = [PERMUTATIONS_PER_TASK] * (permutations // PERMUTATIONS_PER_TASK)
+    if permutations % PERMUTATIONS_PER_TASK:
+        sizes.append(permutations % PERMUTATIONS_PER_TASK)
+    seeds = SeedSequence(seed).spawn(len(sizes))
+    return list(zip(sizes, seeds))
+
+
+def _run(function, tasks, n_jobs, *args):
+    if n_jobs == 1 or len(tasks) == 1:
+        return [function(task, *args) for task in tasks]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(function, task, *args) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def _global_sims(task, z, adjacency, scaling):
+    permutations, seed = task
+    rng = default_rng(seed)
+    batch = max(1, BATCH_SIZE // len(z))
+
+    sims = []
+    for start in range(0, permutations, batch):
+        size = min(batch, permutations - start)
+        permuted = z[argsort(rng.random((size, len(z))), axis=1)]
+        lag = (adjacency @ permuted.T).T
+        sims.append(scaling * (permuted * lag).sum(axis=1))
+    return concatenate(sims)
+
+
+def _local_sims(task, z, adjacency, scaling, observed, keep_simulations):
+    permutations, seed = task
+    rng = default_rng(seed)
+    n = len(z)
+
+    cardinalities = adjacency.getnnz(axis=1)
+    max_cardinality = cardinalities.max()
+
+    # Uniform ordered draws of max_cardinality ids out of the n - 1 others
+    keys = rng.random((permutations, n - 1))
+    ids = argpartition(keys, max_cardinality - 1,
+                       axis=1)[:, :max_cardinality]
+    order = argsort(take_along_axis(keys, ids, axis=1), axis=1)
+    ids = take_along_axis(ids, order, axis=1)
+
+    larger = zeros(n)
+    total = zeros(n)
+    squares = zeros(n)
+    sims = zeros((permutations, n)) if keep_simulations else None
+    for cardinality in unique(cardinalities):
+        if cardinality == 0:
+            larger[cardinalities == 0] = permutations * (observed[
+                cardinalities == 0] <= 0)
+            continue
+        rows = where(cardinalities == cardinality)[0]
+        neighbor_weights = vstack([
+            adjacency.data[adjacency.indptr[row]:adjacency.indptr[row + 1]]
+            for row in rows])
+        cardinality_ids = ids[:, :cardinality]
+
+        batch = max(1, BATCH_SIZE // (permutations * cardinality))
+        for start in range(0, len(rows), batch):
+            batch_rows = rows[start:start + batch]
+            others = cardinality_ids[None, :, :] + (
+                cardinality_ids[None, :, :] >= batch_rows[:, None, None])
+            lag = einsum('rpk,rk->rp', z[others],
+                         neighbor_weights[start:start + batch])
+            batch_sims = z[batch_rows, None] * lag * scaling
+
+            larger[batch_rows] = (
+                batch_sims >= observed[batch_rows, None]).sum(axis=1)
+            total[batch_rows] = batch_sims.sum(axis=1)
+            squares[batch_rows] = (batch_sims ** 2).sum(axis=1)
+            if keep_simulations:
+                sims[:, batch_rows] = batch_sims.T
+    return larger, total, squares, sims
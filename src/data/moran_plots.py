@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import logging
+from functools import partial
+from pathlib import Path
+
+from pandas import read_csv
+
+from esda import Moran, Moran_Local
+from splot.esda import lisa_cluster, plot_local_autocorrelation, plot_moran
+import matplotlib.pyplot as plt
+
+from src.data.lisa import read_lisa
+from src.data.mesh import read_tse_mesh
+from src.data.parallel import run_tasks
+from src.data.series import read_series, series_store_paths
+from src.data.storage import interim_path, read_interim
+from src.data.weights import queen_weights
+
+KINDS = ['values', 'global', 'local']
+
+
+def moran_plot_tasks(parties, kinds, years):
+    """ Returns the (party, kind, year) of every figure of parties and
+        kinds, with a None year for the values plot spanning all of them.
+    """
+    tasks = []
+    for party in parties:
+        for kind in kinds:
+            if kind == 'values':
+                tasks.append((party, kind, None))
+            else:
+                tasks.extend((party, kind, year) for year in years)
+    return tasks
+
+
+def make_moran_plot(task, series_dir, moran_dir, moran_plots_dir, mesh_paths,
+                    mesh_dir, weights_dir, years, manifest, stage,
+                    suffix='', lisa_map=False, formats=('.pdf',)):
+    """ Renders one figure from the stored results: the Moran values of a
+        party over the years, or the global or local plot of a year. The
+        Moran objects are rebuilt without permutations and given the stored
+        simulations and pseudo p-values.
+
+        Results are read from the p_values, simulations and local_moran
+        tables of moran_dir followed by suffix. Local plots are a LISA
+        cluster map named lisa when lisa_map, the splot local
+        autocorrelation panels named local otherwise. Global and local
+        figures are saved in each of formats.
+    """
+    logger = logging.getLogger(__name__)
+
+    party, kind, year = task
+    key = [part for part in task if part is not None]
+    party_dir = Path(moran_dir, party).resolve()
+    plots_party_dir = Path(moran_plots_dir, party).resolve()
+    p_value_path = Path(party_dir, 'p_values{}.csv'.format(suffix)).resolve()
+
+    if kind == 'values':
+        inputs = [p_value_path]
+        fig_paths = [Path(plots_party_dir, 'moran_values.pdf').resolve()]
+    else:
+        table = 'simulations' if kind == 'global' else 'local_moran'
+        table_path = Path(party_dir, table + suffix)
+        inputs = [*series_store_paths(Path(series_dir, party, 'series')),
+                  interim_path(table_path), *mesh_paths]
+        name = 'lisa' if kind == 'local' and lisa_map else kind
+        fig_paths = [Path(plots_party_dir, kind, str(year),
+                          name + fig_format).resolve()
+                     for fig_format in formats]
+    if manifest.is_fresh(stage, key, inputs, fig_paths):
+        return
+    fig_paths[0].parent.mkdir(parents=True, exist_ok=True)
+
+    logger.info('starting to render {} moran plot for {} at {}'.format(
+        kind, party, year))
+
+    if kind != 'values':
+        mesh = read_tse_mesh(*mesh_paths, mesh_dir)
+        weights = queen_weights(mesh, weights_dir, list(mesh_paths))
+        dataset = read_series(Path(series_dir, party, 'series'), [year])
+        merged_mesh = mesh.merge(dataset, on='COD_TSE')
+
+    if kind == 'values':
+        p_value_frame = read_csv(p_value_path)
+
+        fig = plt.figure()
+        ax = plt.subplot()
+        ax.plot(p_value_frame.moran)
+        ax.set_xticklabels([0, *years])
+        ax.set_title(f'Índice de Moran e p-valores ({party})')
+        ax.set_frame_on(False)
+        ax.tick_params(axis='both', length=0, labelsize=12)
+        for i, (moran, p_value) in enumerate(p_value_frame.itertuples(
+                index=False)):
+            ax.annotate(f'{round(moran, 3)} ({p_value})', xy=(i, moran))
+    elif kind == 'global':
+        simulations = read_interim(table_path)
+        moran = Moran(merged_mesh[year], weights, permutations=0)
+        moran.sim = simulations[str(year)].to_numpy()
+
+        fig, ax = plot_moran(moran, zstandard=True, figsize=(10, 4))
+        ax[0].set_title('Distribuição referência')
+        ax[1].set_title(
+            f'Gráfico de dispersão de Moran ({round(moran.I, 2)})')
+        ax[1].set_ylabel(None)
+        fig.suptitle(f'{party}, {year}')
+    else:
+        local_frame = read_lisa(table_path, year)
+        local_frame = local_frame.set_index('COD_TSE').loc[merged_mesh.index]
+        local_moran = Moran_Local(merged_mesh[year], weights, permutations=0)
+        local_moran.p_sim = local_frame.p_sim.to_numpy()
+
+        if lisa_map:
+            fig, ax = lisa_cluster(
+                local_moran, merged_mesh.loc[:, ['geometry', year]],
+                legend=False)
+            ax.set_ylabel(None)
+        else:
+            fig, ax = plot_local_autocorrelation(
+                local_moran, merged_mesh, year)
+            ax[0].set_title('Gráfico de dispersão Moran Local')
+            ax[0].set_ylabel(None)
+            fig.suptitle(f'{party}, {year}')
+
+    for fig_path in fig_paths:
+        fig.savefig(fig_path)
+    plt.close(fig)
+
+    logger.info('done rendering {} moran plot for {} at {}'.format(
+        kind, party, year))
+    manifest.record(stage, key, inputs, fig_paths)
+
+
+def render_moran_plots(tasks, n_jobs=1, **settings):
+    """ Renders the figure of every task of moran_plot_tasks on n_jobs
+        processes, settings being the keyword arguments of make_moran_plot
+        shared by all of them.
+    """
+    run_tasks(partial(make_moran_plot, **settings), tasks, n_jobs)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import logging
+import logging.handlers
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+
+
+def _init_worker(queue, level, initializer=None, initargs=()):
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(queue)]
+    root.setLevel(level)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def run_tasks(function, tasks, n_jobs=1, initializer=None, initargs=()):
+    """ Calls function(task) for every task, e.g. a year of a stage or a
+        figure to render, on a pool of n_jobs processes when more than one
+        is asked, and returns the results in the order of tasks. Log records
+        from the workers are handed to the parent's handlers, so everything
+        ends up in the same output. function must be defined at module level
+        to reach the workers. initializer(*initargs) is called once per
+        worker, or once in this process when running sequentially, before
+        any call.
+    """
+    if n_jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [function(task) for task in tasks]
+
+    root = logging.getLogger()
+    with Manager() as manager:
+        queue = manager.Queue()
+        listener = logging.handlers.QueueListener(
+            queue, *root.handlers, respect_handler_level=True)
+        listener.start()
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs,
+                                     initializer=_init_worker,
+                                     initargs=(queue, root.level, initializer,
+                                               initargs)) as executor:
+                return list(executor.map(function, tasks))
+        finally:
+            listener.stop()
+
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from numpy import array, stack
+from pandas import DataFrame
+
+COORDINATES = ['latitude', 'longitude']
+
+# Bounds are (min, max) per coordinate; min_max and z_score are derived from
+# the coordinates being scaled.
+SCALINGS = {
+    'normalized_lat_lon': {'method': 'min_max'},
+    'epsg_4674': {
+        'method': 'bounds',
+        'latitude': (-122.19, -25.28),
+        'longitude': (-59.87, 32.72)
+    },
+    'epsg_4326': {
+        'method': 'bounds',
+        'latitude': (-180, 180),
+        'longitude': (-90, 90)
+    },
+    'z_score_lat_lon': {'method': 'z_score'}
+}
+
+DEFAULT_SCALINGS = ['normalized_lat_lon', 'epsg_4674', 'epsg_4326']
+
+
+def scaled_columns(scaling):
+    """ Returns the names of the coordinate columns of scaling. """
+    return ['{}_{}'.format(scaling, coordinate) for coordinate in COORDINATES]
+
+
+def _offset_and_scale(spec, coordinates):
+    method = spec['method']
+    if method == 'min_max':
+        minimum = coordinates.min(axis=0)
+        return minimum, coordinates.max(axis=0) - minimum
+    if method == 'z_score':
+        return coordinates.mean(axis=0), coordinates.std(axis=0)
+    if method == 'bounds':
+        bounds = array([spec[coordinate] for coordinate in COORDINATES],
+                       dtype='float64')
+        return bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+    raise ValueError('Unrecognized scaling method: {}'.format(method))
+
+
+def scale_coordinates(frame, scalings=None):
+    """ Returns the latitude and longitude of frame under every one of
+        scalings, names of SCALINGS, as columns named {scaling}_latitude and
+        {scaling}_longitude. The offsets and scales of all of them are
+        stacked, so every variant comes out of a single broadcast.
+    """
+    scalings = scalings or DEFAULT_SCALINGS
+    coordinates = frame[COORDINATES].to_numpy(dtype='float64')
+
+    offsets, scales = zip(*[_offset_and_scale(SCALINGS[scaling], coordinates)
+                            for scaling in scalings])
+    scaled = ((coordinates[None, :, :] - stack(offsets)[:, None, :]) /
+              stack(scales)[:, None, :])
+
+    columns = [column for scaling in scalings
+               for column in scaled_columns(scaling)]
+    values = scaled.transpose(1, 0, 2).reshape(len(frame), -1)
+    return DataFrame(values, index=frame.index, columns=columns)
+
+
+def select_scaling(frame, scaling):
+    """ Returns frame without the coordinate columns of other scalings, with
+        the ones of scaling named latitude and longitude.
+    """
+    missing = [column for column in scaled_columns(scaling)
+               if column not in frame.columns]
+    if missing:
+        raise KeyError('Scaling {} was not written, missing columns: {}'
+                       .format(scaling, ', '.join(missing)))
+    others = [column for other in SCALINGS if other != scaling
+              for column in scaled_columns(other) if column in frame.columns]
+    frame = frame.drop(columns=COORDINATES + others)
+    return frame.rename(columns=dict(zip(scaled_columns(scaling),
+                                         COORDINATES)))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+PRE_2012_COLUMNS = ['data_geracao', 'hora_geracao', 'ano_eleicao', 'num_turno', 'descricao_eleicao', 'sigla_uf', 'sigla_ue', 'cod_mun', 'nome_mun', 'num_zona', 'cod_cargo', 'desc_cargo',
+                    'tipo_legenda', 'nome_coligacao', 'composicao_legenda', 'sigla_partido', 'num_partido', 'nome_partido', 'qtde_votos_nominais', 'qtde_votos_legenda', 'sequencial_coligacao']
+POST_2012_COLUMNS = ['data_geracao', 'hora_geracao', 'ano_eleicao', 'cod_tipo_eleicao', 'nome_eleicao', 'num_turno', 'cod_eleicao', 'descricao_eleicao', 'data_eleicao', 'tipo_abrangencia', 'sigla_uf', 'sigla_ue', 'nome_ue', 'cod_mun',
+                     'nome_mun', 'num_zona', 'cod_cargo', 'desc_cargo', 'tipo_abrangencia', 'num_partido', 'sigla_partido', 'nome_partido', 'seq_coligacao', 'nome_coligacao', 'desc_comp_colig', 'voto_transito', 'qtde_votos_nominais', 'qtde_votos_legenda']
+
+ELECTION_LAYOUTS = {
+    'pre_2012': {
+        'columns': PRE_2012_COLUMNS,
+        'file_extension': 'txt',
+        'header': None
+    },
+    'post_2012': {
+        'columns': POST_2012_COLUMNS,
+        'file_extension': 'csv',
+        'header': 0
+    }
+}
+
+CATEGORICAL_COLUMNS = ['sigla_uf', 'sigla_partido', 'desc_cargo']
+
+ELECTION_DTYPES = {
+    'ano_eleicao': 'int16',
+    'num_turno': 'int8',
+    'cod_mun': 'int32',
+    'nome_mun': 'object',
+    'num_zona': 'int16',
+    'cod_cargo': 'int8',
+    'nome_coligacao': 'object',
+    'num_partido': 'int16',
+    'qtde_votos_nominais': 'int32',
+    'qtde_votos_legenda': 'int32',
+    **{column: 'category' for column in CATEGORICAL_COLUMNS}
+}
+
+ELECTION_COLUMNS_TO_USE = ['ano_eleicao', 'num_turno', 'sigla_uf', 'cod_mun',
+                           'nome_mun', 'num_zona', 'cod_cargo', 'desc_cargo',
+                           'nome_coligacao', 'sigla_partido', 'num_partido',
+                           'qtde_votos_nominais', 'qtde_votos_legenda']
+
+PROFILE_PRE_2018_COLUMNS = ['PERIODO', 'UF',
+                            'MUNICIPIO', 'CD_MUNICIPIO', 'NR_ZONA', 'DS_GENERO', 'DS_FAIXA_ETARIA', 'DS_GRAU_ESCOLARIDADE', 'QT_ELEITORES_PERFIL']
+PROFILE_2018_COLUMNS = ['DT_GERACAO', 'HH_GERACAO', 'ANO_ELEICAO', 'SG_UF', 'CD_MUNICIPIO',
+                        'NM_MUNICIPIO', 'CD_MUN_SIT_BIOMETRIA', 'DS_MUN_SIT_BIOMETRIA',
+                        'NR_ZONA', 'CD_GENERO', 'DS_GENERO', 'CD_ESTADO_CIVIL',
+                        'DS_ESTADO_CIVIL', 'CD_FAIXA_ETARIA', 'DS_FAIXA_ETARIA',
+                        'CD_GRAU_ESCOLARIDADE', 'DS_GRAU_ESCOLARIDADE', 'QT_ELEITORES_PERFIL',
+                        'QT_ELEITORES_BIOMETRIA', 'QT_ELEITORES_DEFICIENCIA',
+                        'QT_ELEITORES_INC_NM_SOCIAL']
+
+PROFILE_LAYOUTS = {
+    'pre_2018': {
+        'columns': PROFILE_PRE_2018_COLUMNS,
+        'file_extension': 'txt',
+        'header': None
+    },
+    '2018': {
+        'columns': PROFILE_2018_COLUMNS,
+        'file_extension': 'csv',
+        'header': 0
+    }
+}
+
+PROFILE_DTYPES = {
+    'CD_MUNICIPIO': 'int32',
+    'DS_GENERO': 'category',
+    'DS_FAIXA_ETARIA': 'category',
+    'DS_GRAU_ESCOLARIDADE': 'category',
+    'QT_ELEITORES_PERFIL': 'int32'
+}
+
+PROFILE_COLUMNS_TO_USE = ['CD_MUNICIPIO', 'DS_GENERO', 'DS_FAIXA_ETARIA',
+                          'DS_GRAU_ESCOLARIDADE', 'QT_ELEITORES_PERFIL']
+
+
+def read_options(layout, dtypes, columns_to_use=None):
+    """ Returns the read_csv keyword arguments loading only columns_to_use
+        from a file with the given layout, and the names of the loaded
+        columns in file order. Columns are picked by position, so layouts
+        repeating a name (tipo_abrangencia after 2012) keep its first one.
+    """
+    positions, names = [], []
+    for position, name in enumerate(layout['columns']):
+        if name in names:
+            continue
+        if columns_to_use is None or name in columns_to_use:
+            positions.append(position)
+            names.append(name)
+
+    options = {
+        'header': None,
+        'skiprows': 0 if layout['header'] is None else layout['header'] + 1,
+        'usecols': positions,
+        'dtype': {position: dtypes[name]
+                  for position, name in zip(positions, names)
+                  if name in dtypes}
+    }
+    return options, names
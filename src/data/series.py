@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import json
+from pathlib import Path
+
+from numpy import array, ascontiguousarray, asarray, load, save
+from pandas import Categorical, DataFrame, Index, concat
+
+from src.data.storage import read_interim
+
+SERIES_DTYPE = 'float32'
+
+
+def series_column(year):
+    return 'percentual_votos_{}'.format(year)
+
+
+def read_shares(parties_dir, parties, years):
+    """ Returns the vote shares of every party in every year as one long
+        frame of party, year, cod_mun and percentual_votos, read from the
+        party.csv of each (year, party) under parties_dir.
+    """
+    frames = []
+    for year in years:
+        for party in parties:
+            data = read_interim(Path(parties_dir, str(year), party,
+                                     'party.csv'),
+                                columns=['cod_mun', 'percentual_votos'])
+            data['party'] = party
+            data['year'] = year
+            frames.append(data)
+
+    shares = concat(frames, ignore_index=True)
+    shares['party'] = Categorical(shares.party, categories=list(parties))
+    shares['year'] = shares.year.astype('int16')
+    return shares
+
+
+def make_series(shares, years):
+    """ Returns a dict with the municipality by year matrix of every party
+        of shares, built with a single groupby and unstack of the long
+        frame. Matrices are dense float32, indexed and sorted by an int32
+        cod_mun, with a percentual_votos_{year} column per year and 0 where
+        a party got no votes.
+    """
+    matrix = shares.groupby(['party', 'cod_mun', 'year'], observed=True)[
+        'percentual_votos'].sum().unstack('year', fill_value=0)
+    matrix = matrix.reindex(columns=list(years), fill_value=0)
+    matrix = matrix.astype(SERIES_DTYPE)
+    matrix.columns = [series_column(year) for year in years]
+
+    series = {}
+    for party in shares.party.cat.categories:
+        if party in matrix.index.get_level_values('party'):
+            dataset = matrix.xs(party, level='party')
+        else:
+            dataset = matrix.iloc[:0].droplevel('party')
+        dataset.index = dataset.index.astype('int32')
+        series[party] = dataset.sort_index()
+    return series
+
+
+def series_store_paths(file_path):
+    """ Returns the paths of the matrix and of the json index of the series
+        store at file_path, whatever its suffix.
+    """
+    file_path = Path(file_path)
+    return file_path.with_suffix('.npy'), file_path.with_suffix('.json')
+
+
+def write_series_store(dataset, years, file_path):
+    """ Writes dataset, a municipality by year matrix as made by
+        make_series, as a C-ordered float32 .npy that numpy can memory map,
+        with a json index of its cod_mun codes, years and column names.
+        Returns the paths of both.
+    """
+    values_path, index_path = series_store_paths(file_path)
+    save(values_path,
+         ascontiguousarray(dataset.to_numpy(dtype=SERIES_DTYPE)))
+    with open(index_path, 'w') as index_file:
+        json.dump({'cod_mun': [int(code) for code in dataset.index],
+                   'years': [int(year) for year in years],
+                   'columns': [str(column) for column in dataset.columns]},
+                  index_file)
+    return values_path, index_path
+
+
+def open_series_store(file_path):
+    """ Returns the matrix of the series store at file_path memory mapped
+        read only, with its cod_mun codes, years and column names. Nothing
+        is copied, and processes opening the same store share its pages in
+        the OS cache.
+    """
+    values_path, index_path = series_store_paths(file_path)
+    with open(index_path) as index_file:
+        index = json.load(index_file)
+    values = load(values_path, mmap_mode='r')
+    return (values, array(index['cod_mun'], dtype='int32'), index['years'],
+            index['columns'])
+
+
+def read_series_store(file_path, cod_mun=None, years=None):
+    """ Returns the series store at file_path as a frame indexed by
+        cod_mun. Only the rows of cod_mun and the columns of years, all of
+        them when None, are read from the mapped matrix.
+    """
+    values, codes, store_years, columns = open_series_store(file_path)
+
+    if cod_mun is not None:
+        rows = Index(codes).get_indexer(cod_mun)
+        if (rows < 0).any():
+            raise KeyError('Municipalities missing from {}'.format(file_path))
+        codes = codes[rows]
+        values = values[rows]
+    if years is not None:
+        positions = [store_years.index(year) for year in years]
+        columns = [columns[position] for position in positions]
+        values = values[:, positions]
+    if cod_mun is None and years is None:
+        values = array(values)
+
+    return DataFrame(asarray(values), index=Index(codes, name='cod_mun'),
+                     columns=columns)
+
+
+def read_series(file_path, years, cod_mun=None):
+    """ Returns the series of years of the store at file_path indexed by
+        COD_TSE, with one column per year, only reading the rows of cod_mun
+        when given. Values are widened to float64, which esda keeps for its
+        statistics.
+    """
+    dataset = read_series_store(file_path, cod_mun, years).astype('float64')
+    dataset.index.name = 'COD_TSE'
+    dataset.columns = years
+    return dataset
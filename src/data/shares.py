@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from numpy import unique
+
+from src.data.storage import read_interim, write_interim
+
+SHARES_DTYPES = {
+    'cod_mun': 'int32',
+    'sigla_partido': 'category',
+    'percentual_votos': 'float32'
+}
+
+
+def make_shares(data):
+    """ Returns the vote share of every party in every municipality of the
+        percentual data of a year, one row per (cod_mun, sigla_partido)
+        sorted by both, with a single groupby.
+    """
+    shares = data.groupby(['cod_mun', 'sigla_partido'], observed=True)[
+        'percentual_votos'].sum().reset_index()
+    shares['sigla_partido'] = shares.sigla_partido.astype(str)
+    shares = shares.astype(SHARES_DTYPES)
+    return shares.sort_values(['cod_mun', 'sigla_partido'],
+                              ignore_index=True)
+
+
+def write_shares(shares, file_path):
+    """ Writes shares as one columnar file, the parties dictionary encoded
+        by the parquet and feather backends.
+    """
+    return write_interim(shares.astype(SHARES_DTYPES), file_path)
+
+
+def read_shares_matrix(file_path, parties=None):
+    """ Returns the municipality by party matrix of the shares at
+        file_path, see shares_matrix.
+    """
+    return shares_matrix(read_interim(file_path), parties)
+
+
+def shares_matrix(shares, parties=None):
+    """ Returns the municipality by party float32 matrix of shares, with
+        one row per municipality of shares, one column per party of parties,
+        all of them when None, and 0 where a party got no votes.
+    """
+    shares = shares.astype(SHARES_DTYPES)
+    municipalities = unique(shares.cod_mun)
+    if parties is not None:
+        parties = list(parties)
+        shares = shares.assign(
+            sigla_partido=shares.sigla_partido.cat.set_categories(parties))
+        shares = shares[shares.sigla_partido.notna()]
+
+    matrix = shares.pivot(index='cod_mun', columns='sigla_partido',
+                          values='percentual_votos')
+    matrix = matrix.reindex(index=municipalities)
+    if parties is not None:
+        matrix = matrix.reindex(columns=parties)
+    matrix = matrix.fillna(0).astype(SHARES_DTYPES['percentual_votos'])
+    matrix.columns = matrix.columns.astype(str)
+    matrix.columns.name = 'sigla_partido'
+    return matrix
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from zipfile import ZipFile
+
+from pandas import read_csv, concat
+
+from src.data.schema import (ELECTION_COLUMNS_TO_USE, ELECTION_DTYPES,
+                             read_options)
+from src.data.storage import write_interim_chunks
+
+
+def _archive_path(raw_dir, year):
+    return Path(raw_dir, 'elections_1994_2018',
+                'votacao_partido_munzona_{}.zip'.format(year)).resolve()
+
+
+def _state_file_name(year, state, metadata):
+    return 'votacao_partido_munzona_{}_{}.{}'.format(
+        year, state, metadata['file_extension'])
+
+
+def _state_file_path(raw_dir, year, state, metadata):
+    return Path(raw_dir, 'elections_1994_2018',
+                'votacao_partido_munzona_{}'.format(year),
+                _state_file_name(year, state, metadata)).resolve()
+
+
+def state_sources(raw_dir, year, metadata, source='dir'):
+    """ Returns the raw files a year is read from: its zip archive or its
+        extracted state files.
+    """
+    if source == 'zip':
+        return [_archive_path(raw_dir, year)]
+    return [_state_file_path(raw_dir, year, state, metadata)
+            for state in metadata['states']]
+
+
+def iter_state_chunks(raw_dir, year, state, metadata, source='dir',
+                      chunksize=None):
+    """ Yields the rows of one votacao_partido_munzona state file, either
+        extracted under raw_dir or read straight from the year zip archive.
+        Without a chunksize the whole state comes as a single frame.
+    """
+    if source == 'zip':
+        with ZipFile(_archive_path(raw_dir, year)) as archive:
+            file_name = _state_file_name(year, state, metadata)
+            with archive.open(file_name) as state_file:
+                yield from _read_chunks(state_file, metadata, chunksize)
+    else:
+        file_path = _state_file_path(raw_dir, year, state, metadata)
+        yield from _read_chunks(file_path, metadata, chunksize)
+
+
+def _read_chunks(file, metadata, chunksize):
+    options, names = read_options(metadata, ELECTION_DTYPES,
+                                  ELECTION_COLUMNS_TO_USE)
+    data = read_csv(file, sep=';', encoding='latin', chunksize=chunksize,
+                    **options)
+    chunks = data if chunksize else [data]
+    for chunk in chunks:
+        chunk.columns = names
+        yield chunk
+
+
+def read_states(raw_dir, year, metadata, source='dir', n_jobs=1):
+    """ Reads every state file of a year, n_jobs at a time, and joins them
+        with a single concat sorted by state and city.
+    """
+    def read_state(state):
+        return concat(iter_state_chunks(raw_dir, year, state, metadata,
+                                        source))
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        states = list(executor.map(read_state, metadata['states']))
+
+    br = concat(states, ignore_index=True)
+    br.sort_values(by=['sigla_uf', 'nome_mun'], inplace=True)
+    return br
+
+
+def write_states(raw_dir, year, metadata, destination_path, source='dir',
+                 chunksize=None):
+    """ Appends each state's rows straight to destination_path, so only one
+        state (or one chunk of it) is held in memory. Rows keep the state
+        order instead of being sorted by city, which no later stage needs.
+    """
+    chunks = (chunk
+              for state in metadata['states']
+              for chunk in iter_state_chunks(raw_dir, year, state, metadata,
+                                             source, chunksize))
+    return write_interim_chunks(chunks, destination_path)
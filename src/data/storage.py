@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+from pathlib import Path
+
+from pandas import Series, read_csv, read_feather, read_parquet
+
+from src.data.schema import ELECTION_DTYPES
+
+SUFFIXES = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather'
+}
+
+INTERIM_DTYPES = ELECTION_DTYPES
+
+
+def get_interim_format(interim_format=None):
+    """ Returns the backend used for interim datasets: the given one or the
+        INTERIM_FORMAT environment variable, defaulting to csv.
+    """
+    interim_format = interim_format or os.environ.get('INTERIM_FORMAT', 'csv')
+    if interim_format not in SUFFIXES:
+        raise ValueError('Unrecognized interim format: {}'.format(
+            interim_format))
+    return interim_format
+
+
+def interim_path(file_path, interim_format=None):
+    interim_format = get_interim_format(interim_format)
+    return Path(file_path).with_suffix(SUFFIXES[interim_format])
+
+
+def temporary_path(file_path):
+    """ Returns a path next to file_path, with its suffix and unique to the
+        process, to write it to before os.replace moves it in place.
+    """
+    file_path = Path(file_path)
+    return file_path.with_name('{}.{}.tmp{}'.format(
+        file_path.stem, os.getpid(), file_path.suffix))
+
+
+def apply_dtypes(frame):
+    dtypes = {column: dtype for column, dtype in INTERIM_DTYPES.items()
+              if column in frame.columns and frame[column].dtype != dtype}
+    return frame.astype(dtypes)
+
+
+def write_interim(frame, file_path, index=False, interim_format=None):
+    """ Writes frame with the interim dtypes. Categorical columns are
+        dictionary encoded by the parquet and feather backends. An index
+        asked to be kept is stored as regular columns.
+    """
+    interim_format = get_interim_format(interim_format)
+    file_path = interim_path(file_path, interim_format)
+
+    if isinstance(frame, Series):
+        frame = frame.to_frame()
+    frame = frame.reset_index(drop=not index)
+    frame = apply_dtypes(frame)
+    for column in frame.select_dtypes(include='category').columns:
+        frame[column] = frame[column].cat.remove_unused_categories()
+
+    if interim_format == 'parquet':
+        frame.to_parquet(file_path, index=False)
+    elif interim_format == 'feather':
+        frame.to_feather(file_path)
+    else:
+        frame.to_csv(file_path, index=False)
+    return file_path
+
+
+def write_interim_chunks(chunks, file_path, interim_format=None):
+    """ Writes an iterable of frames sharing the same columns one at a time,
+        so only a chunk is held in memory.
+    """
+    interim_format = get_interim_format(interim_format)
+    file_path = interim_path(file_path, interim_format)
+
+    if interim_format == 'csv':
+        header = True
+        for chunk in chunks:
+            apply_dtypes(chunk).to_csv(file_path, index=False, header=header,
+                                       mode='w' if header else 'a')
+            header = False
+        return file_path
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, schema = None, None
+    try:
+        for chunk in chunks:
+            # Each chunk would get its own dictionary, so categories are
+            # written as plain strings and restored by apply_dtypes on read.
+            chunk = apply_dtypes(chunk.reset_index(drop=True))
+            categorical = chunk.select_dtypes(include='category').columns
+            chunk[categorical] = chunk[categorical].astype(object)
+            table = pa.Table.from_pandas(chunk, schema=schema,
+                                         preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                if interim_format == 'parquet':
+                    writer = pq.ParquetWriter(str(file_path), schema)
+                else:
+                    writer = pa.ipc.new_file(str(file_path), schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return file_path
+
+
+def read_interim(file_path, columns=None, interim_format=None):
+    """ Reads an interim dataset, loading only the given columns when a
+        projection is passed.
+    """
+    interim_format = get_interim_format(interim_format)
+    file_path = interim_path(file_path, interim_format)
+
+    if interim_format == 'parquet':
+        frame = read_parquet(file_path, columns=columns)
+    elif interim_format == 'feather':
+        frame = read_feather(file_path, columns=columns)
+    else:
+        frame = read_csv(file_path, usecols=columns, dtype=INTERIM_DTYPES)
+    return apply_dtypes(frame)
+
+
+def iter_interim(file_path, columns=None, chunksize=100000,
+                 interim_format=None):
+    """ Yields an interim dataset in frames of about chunksize rows, loading
+        only the given columns.
+    """
+    interim_format = get_interim_format(interim_format)
+    file_path = interim_path(file_path, interim_format)
+
+    if interim_format == 'csv':
+        chunks = read_csv(file_path, usecols=columns, dtype=INTERIM_DTYPES,
+                          chunksize=chunksize)
+        for chunk in chunks:
+            yield apply_dtypes(chunk)
+        return
+
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if interim_format == 'parquet':
+        batches = pq.ParquetFile(str(file_path)).iter_batches(
+            batch_size=chunksize, columns=columns)
+    else:
+        table = feather.read_table(str(file_path), columns=columns,
+                                   memory_map=True)
+        batches = table.to_batches(max_chunksize=chunksize)
+    for batch in batches:
+        yield apply_dtypes(batch.to_pandas())
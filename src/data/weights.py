@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+from numpy import array, load, savez
+from scipy.sparse import csr_matrix
+
+from libpysal.weights import Queen, WSP
+
+from src.data.mesh import source_hash
+from src.data.storage import temporary_path
+
+
+def weights_key(mesh, sources):
+    """ Hashes the files mesh was built from together with its index, which
+        sets the order of the weights rows.
+    """
+    digest = hashlib.sha256()
+    for source in sources:
+        digest.update(source_hash(source).encode())
+    digest.update(','.join(str(id_) for id_ in mesh.index).encode())
+    return digest.hexdigest()
+
+
+def queen_weights(mesh, cache_dir, sources):
+    """ Returns the Queen contiguity weights of mesh. They are kept in
+        cache_dir as the csr arrays of the adjacency matrix and its ids,
+        so a mesh built from unchanged sources is loaded instead of having
+        its polygons intersected again. The cache is written to a temporary
+        file and moved in place, so concurrent processes never load a
+        partial one.
+    """
+    logger = logging.getLogger(__name__)
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = Path(cache_dir, 'queen_{}.npz'.format(
+        weights_key(mesh, sources)[:16]))
+
+    if cache_path.exists():
+        logger.info('loading weights from {}'.format(cache_path))
+        with load(cache_path, allow_pickle=False) as cache:
+            adjacency = csr_matrix(
+                (cache['data'], cache['indices'], cache['indptr']),
+                shape=tuple(cache['shape']))
+            ids = cache['ids'].tolist()
+        return WSP(adjacency, id_order=ids).to_W(silence_warnings=True)
+
+    logger.info('starting to calculate weights...')
+    weights = Queen.from_dataframe(mesh)
+    adjacency = weights.sparse.tocsr()
+    temporary_cache_path = temporary_path(cache_path)
+    savez(temporary_cache_path, data=adjacency.data,
+          indices=adjacency.indices, indptr=adjacency.indptr,
+          shape=array(adjacency.shape), ids=array(weights.id_order))
+    os.replace(temporary_cache_path, cache_path)
+    logger.info('done calculating weights, cached at {}'.format(cache_path))
+    return weights
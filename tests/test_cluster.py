@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import pytest
+from numpy import array
+from numpy.random import default_rng
+from numpy.testing import assert_allclose
+from scipy.cluster.hierarchy import linkage
+from sklearn.metrics import (calinski_harabasz_score, davies_bouldin_score,
+                             silhouette_samples, silhouette_score)
+
+from src.data.cluster import cluster_metrics, cut_tree_labels
+
+N_CLUSTERS_VALUES = [2, 3, 5, 8]
+
+
+@pytest.fixture
+def values():
+    return default_rng(0).normal(size=(80, 4))
+
+
+@pytest.fixture
+def labels_matrix(values):
+    return cut_tree_labels(linkage(values, method='ward'), N_CLUSTERS_VALUES)
+
+
+def test_metrics_match_sklearn(values, labels_matrix):
+    metrics = cluster_metrics(values, labels_matrix, N_CLUSTERS_VALUES)
+
+    for column, n_clusters in enumerate(N_CLUSTERS_VALUES):
+        labels = labels_matrix[:, column]
+        assert_allclose(metrics.loc[n_clusters, 'silhouette'],
+                        silhouette_score(values, labels))
+        assert_allclose(metrics.loc[n_clusters, 'calinski_harabasz'],
+                        calinski_harabasz_score(values, labels))
+        assert_allclose(metrics.loc[n_clusters, 'davies_bouldin'],
+                        davies_bouldin_score(values, labels))
+
+
+def test_sampled_silhouette_averages_sklearn_samples(values, labels_matrix):
+    metrics = cluster_metrics(values, labels_matrix, N_CLUSTERS_VALUES,
+                              sample_size=30, seed=1)
+
+    rows = default_rng(1).choice(len(values), 30, replace=False)
+    for column, n_clusters in enumerate(N_CLUSTERS_VALUES):
+        samples = silhouette_samples(values, labels_matrix[:, column])
+        assert_allclose(metrics.loc[n_clusters, 'silhouette'],
+                        samples[rows].mean())
+
+
+def test_singleton_clusters_match_sklearn():
+    values = default_rng(2).normal(size=(12, 2))
+    # The last row is alone in its cluster
+    labels = array([1] * 6 + [2] * 5 + [3], dtype='int8')
+
+    metrics = cluster_metrics(values, labels[:, None], [3])
+
+    assert_allclose(metrics.loc[3, 'silhouette'],
+                    silhouette_score(values, labels))
+    assert_allclose(metrics.loc[3, 'davies_bouldin'],
+                    davies_bouldin_score(values, labels))
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import pytest
+from pandas import DataFrame, concat
+from pandas.testing import assert_frame_equal
+
+from src.data.make_profile_dataset import (aggregate_profile,
+                                           normalize_categories,
+                                           stream_profile)
+
+
+def profile_chunk(rows):
+    chunk = DataFrame(rows, columns=['CD_MUNICIPIO', 'DS_GENERO',
+                                     'QT_ELEITORES_PERFIL'])
+    chunk['DS_GENERO'] = chunk.DS_GENERO.astype('category')
+    return chunk
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_stream_matches_batch_across_chunks(sparse):
+    # Municipality 1 is only in the first chunk and OUTRO only in the second
+    chunks = [
+        profile_chunk([(1, 'masculino', 10), (2, 'feminino', 5)]),
+        profile_chunk([(2, 'masculino', 3), (3, 'outro', 4)])
+    ]
+    dataset = concat(chunks, ignore_index=True)
+    dataset['DS_GENERO'] = dataset.DS_GENERO.astype('category')
+    dataset['DS_GENERO'] = normalize_categories(dataset.DS_GENERO)
+
+    streamed = stream_profile([chunk.copy() for chunk in chunks], sparse)
+    batch = aggregate_profile(dataset, sparse)
+
+    assert not streamed.isna().any().any()
+    assert_frame_equal(streamed, batch, check_dtype=False)
+
+
+def test_stream_without_chunks_raises():
+    with pytest.raises(ValueError):
+        stream_profile([])
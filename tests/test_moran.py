@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import pytest
+from numpy import minimum, random, sqrt
+from numpy.random import default_rng
+from numpy.testing import assert_allclose, assert_array_equal
+from pandas import DataFrame
+
+from esda import Moran, Moran_Local
+from libpysal.weights import lat2W
+
+from src.data.moran import compute_local_moran, compute_moran, moran_matrix
+
+STATISTICS = ['I', 'EI', 'VI_norm', 'seI_norm', 'z_norm', 'p_norm',
+              'VI_rand', 'seI_rand', 'z_rand', 'p_rand']
+
+
+@pytest.fixture
+def weights():
+    return lat2W(9, 9)
+
+
+@pytest.fixture
+def values(weights):
+    rng = default_rng(0)
+    noise = rng.normal(size=(weights.n, 3))
+    # One column without and two with spatial autocorrelation
+    trend = (weights.sparse @ noise[:, 1:]) + noise[:, 1:]
+    return DataFrame({'noise': noise[:, 0], 'lagged': trend[:, 0],
+                      'skewed': trend[:, 1] ** 3})
+
+
+def test_moran_matrix_matches_esda(values, weights):
+    result = moran_matrix(values, weights)
+
+    for column in values.columns:
+        moran = Moran(values[column].to_numpy(), weights, permutations=0)
+        for statistic in STATISTICS:
+            assert_allclose(result.loc[column, statistic],
+                            getattr(moran, statistic), err_msg=statistic)
+
+
+def test_moran_matrix_keeps_weights_transform(values, weights):
+    weights.transform = 'b'
+    moran_matrix(values, weights, transformation='r')
+
+    assert weights.transform == 'B'
+
+
+def pseudo_p_values(sim, observed, permutations):
+    larger = (sim >= observed).sum(axis=0)
+    return (minimum(larger, permutations - larger) + 1.) / (permutations + 1.)
+
+
+@pytest.mark.parametrize('column', ['noise', 'lagged'])
+def test_compute_moran_matches_esda(values, weights, column):
+    y = values[column].to_numpy()
+    moran = compute_moran(y, weights, permutations=2000, seed=0)
+    expected = Moran(y, weights, permutations=0)
+
+    assert_allclose(moran.I, expected.I)
+    assert len(moran.sim) == 2000
+    assert_allclose(moran.p_sim, pseudo_p_values(moran.sim, moran.I, 2000))
+    # The reference distribution has the moments of the randomization
+    # assumption, up to the error of 2000 draws
+    assert abs(moran.EI_sim - expected.EI) < 5 * expected.seI_rand / sqrt(2000)
+    assert_allclose(moran.seI_sim, expected.seI_rand, rtol=0.08)
+
+
+def test_compute_moran_p_value_matches_esda_when_clustered(values, weights):
+    y = values['lagged'].to_numpy()
+    moran = compute_moran(y, weights, permutations=999, seed=0)
+    random.seed(0)
+    expected = Moran(y, weights, permutations=999)
+
+    assert moran.p_sim == expected.p_sim == 1. / 1000
+
+
+@pytest.mark.parametrize('column', ['noise', 'lagged'])
+def test_compute_local_moran_matches_esda(values, weights, column):
+    y = values[column].to_numpy()
+    local_moran = compute_local_moran(y, weights, permutations=5000, seed=0,
+                                      keep_simulations=True)
+    expected = Moran_Local(y, weights, permutations=5000, seed=0)
+
+    assert_allclose(local_moran.Is, expected.Is)
+    assert_array_equal(local_moran.q, expected.q)
+    assert local_moran.sim.shape == (5000, weights.n)
+    assert_allclose(local_moran.p_sim,
+                    pseudo_p_values(local_moran.sim, local_moran.Is, 5000))
+    # Both reference distributions draw the neighbours of every observation
+    # among the others, so their moments agree up to the error of the draws
+    tolerance = 6 * expected.seI_sim * sqrt(2. / 5000)
+    assert (abs(local_moran.EI_sim - expected.EI_sim) < tolerance).all()
+    assert_allclose(local_moran.seI_sim, expected.seI_sim, rtol=0.1)
+
+
+def test_permutations_do_not_depend_on_n_jobs(values, weights):
+    y = values['lagged'].to_numpy()
+
+    moran = compute_moran(y, weights, permutations=1500, seed=0)
+    spread = compute_moran(y, weights, permutations=1500, seed=0, n_jobs=2)
+    assert_array_equal(moran.sim, spread.sim)
+
+    local_moran = compute_local_moran(y, weights, permutations=1500, seed=0)
+    spread = compute_local_moran(y, weights, permutations=1500, seed=0,
+                                 n_jobs=2)
+    assert_array_equal(local_moran.p_sim, spread.p_sim)
+    assert_allclose(local_moran.EI_sim, spread.EI_sim)